@@ -0,0 +1,520 @@
+"""
+Microbenchmarks for components. Run with CPython:
+
+    python benchmarks.py [name ...]
+
+Without arguments every benchmark is run.
+"""
+import gc
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+from multiprocessing import get_context
+
+from components import ObjectWithProperties, Property, RefMap, Component, Register, BrowserDOMRender, initialize_comps_classes
+from components import HTMLComp, compile_expr, headless
+from components.base import partial, ChainPropBinding, HTMLNode, DynNode
+
+NUMBER = 200000
+MEMORY_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memory_budget.json')
+FAILURES = []  # Exceeded budgets, main() exits with 1
+
+
+class BenchObj(ObjectWithProperties):
+    a = Property(0)
+    b = Property(0)
+
+
+def _context(obj):
+    return {'self': RefMap.get_ref(obj), 'parent': RefMap.get_ref(obj),
+            'root': RefMap.get_ref(obj), 'this': RefMap.add(None)}
+
+
+def bench_callbacks(number=NUMBER):
+    """Per notification overhead of partial() vs ChainPropBinding"""
+    obj = BenchObj()
+    context = _context(obj)
+    # Trivial expression so the measure is dominated by the callback dispatch
+    expr = lambda root, parent, self, this: 1
+    objref = RefMap.get_ref(obj)
+
+    old = partial(obj._chain_prop, propname='b', expression=expr, context=context, objref=objref)
+    new = ChainPropBinding(obj, 'b', expr, context, objref)
+    direct = obj._chain_prop
+
+    t_direct = timeit.timeit(lambda: direct(1, obj, 'b', expr, context, objref), number=number)
+    t_old = timeit.timeit(lambda: old(1, obj), number=number)
+    t_new = timeit.timeit(lambda: new(1, obj), number=number)
+
+    results = [('direct _chain_prop', t_direct), ('partial()', t_old), ('ChainPropBinding', t_new)]
+    for name, t in results:
+        print("%-22s %8.1f ns/call  overhead %7.1f ns" % (
+            name, t / number * 1e9, (t - t_direct) / number * 1e9))
+    return results
+
+
+class BenchRow(Component):
+    template = ("<BenchRow><td class='id'>{root.n}</td><td class='label'><a href='#' onclick='{root.select()}'>"
+                "{root.label}</a></td><td class='actions'><span class='icon remove'></span> remove</td></BenchRow>")
+    rendertag = 'tr'
+    n = Property(0)
+    label = Property('')
+
+    def select(self):
+        pass
+
+
+class BenchTable(Component):
+    template = "<BenchTable><tbody cid='body'></tbody></BenchTable>"
+    rendertag = 'table'
+
+
+Register.add(BenchRow)
+Register.add(BenchTable)
+
+
+class DOMCallCounter(object):
+    """Counts the DOM calls made by components on the headless DOM (nested calls count once)"""
+    METHODS = ((headless.Document, 'createElement'), (headless.Document, 'createTextNode'),
+               (headless.Element, 'setAttribute'), (headless.Node, 'appendChild'),
+               (headless.Node, 'insertBefore'), (headless.Node, 'cloneNode'))
+    # Calls that detach nodes, html is the innerHTML setter
+    REMOVALS = ((headless.Node, 'removeChild'), (headless.Node, 'html'), (headless.Node, 'innerHTML'))
+
+    def __init__(self, methods=METHODS):
+        self.methods = methods
+
+    def __enter__(self):
+        self.calls = 0
+        self.depth = 0
+        self.saved = []
+        for cls, name in self.methods:
+            method = cls.__dict__[name]
+            self.saved.append((cls, name, method))
+            if isinstance(method, property):
+                setattr(cls, name, property(method.fget, self._wrap(method.fset)))
+            else:
+                setattr(cls, name, self._wrap(method))
+        return self
+
+    def _wrap(self, method):
+        def wrapper(*args, **kwargs):
+            if self.depth == 0:
+                self.calls += 1
+            self.depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.depth -= 1
+        return wrapper
+
+    def __exit__(self, *exc):
+        for cls, name, method in self.saved:
+            setattr(cls, name, method)
+
+
+def _node_memory(factory, nodes):
+    """Bytes per node allocated by factory(elem, root), without the DOM (the same for any node type)"""
+    elems = [headless.document.createElement('DIV') for i in range(nodes)]
+    # A root per measurement: the observers of the previous nodes don't grow its tables
+    root = BenchObj()
+    root.root = root
+    gc.collect()
+    tracemalloc.start()
+    created = [factory(elem, root) for elem in elems]
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, headless.__file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+    tracemalloc.stop()
+    for node in created:
+        RefMap.remove(node)
+    return sum(stat.size for stat in snapshot.statistics('filename')) / float(nodes)
+
+
+def bench_nodes(nodes=2000):
+    """Memory per node (tracemalloc) of HTMLComp vs HTMLNode (DynNode for dynodes)"""
+    expr = compile_expr('root.a')
+    props2bind = [['root', 'a']]  # Shared by the nodes of an instruction, as when mounting a template
+
+    def comp_text(elem, root):
+        node = HTMLComp('text', elem)
+        node.parent = node.root = root
+        node.set_context(root)
+        node.is_mounted = True
+        return node
+
+    def comp_dynode(elem, root):
+        node = comp_text(elem, root)
+        node.update_with_expression('html', expr, node.context, node, props2bind)
+        return node
+
+    def node_text(elem, root):
+        node = HTMLNode('text', elem)
+        node.parent = node.root = root
+        node.is_mounted = True
+        return node
+
+    def node_dynode(elem, root):
+        node = DynNode('DYNODE', elem)
+        node.parent = node.root = root
+        node.is_mounted = True
+        node.bind_expression('html', expr, props2bind)
+        return node
+
+    results = []
+    for kind, comp_factory, node_factory in (('text', comp_text, node_text), ('dynode', comp_dynode, node_dynode)):
+        comp_size = _node_memory(comp_factory, nodes)
+        node_size = _node_memory(node_factory, nodes)
+        print("%-7s HTMLComp %5d bytes/node  HTMLNode %4d bytes/node  %4.1fx" % (
+            kind, comp_size, node_size, comp_size / node_size))
+        results.append((kind, comp_size, node_size))
+    return results
+
+
+def bench_pool(items=500, cycles=20):
+    """Continuous filtering of a FilteredList of ListItems, without and with a pool"""
+    from components.custom import FilteredList, ListItem
+    initialize_comps_classes()
+    BrowserDOMRender.direct = True
+    values = ['Item %s' % i for i in range(items)]
+    results = []
+    for pool_size in (0, items):
+        ListItem.pool_size = pool_size
+        flist = FilteredList()
+        flist.root = flist
+        flist.itemtag = 'ListItem'
+        flist.mount()
+        flist.initial_items = values
+        flist.filtervalue = '1'  # Warm up the pool
+        flist.filtervalue = ''
+        gc.collect()
+        iids = ObjectWithProperties.cnt
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(cycles):
+            flist.filtervalue = str(i % 10)
+            flist.filtervalue = ''
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        created = ObjectWithProperties.cnt - iids
+        print("pool_size %4d  %7.1f ms/cycle  %6.1f components created/cycle  %8d bytes retained/cycle" % (
+            pool_size, elapsed * 1000 / cycles, created / float(cycles), current / cycles))
+        results.append((pool_size, elapsed, created, current))
+        flist.remove_all()
+    ListItem.pool_size = 0
+    return results
+
+
+def bench_children(sizes=(2500, 5000, 10000)):
+    """add, query and remove_all with many children: time per child should stay flat"""
+    from components import HTMLComp
+    BrowserDOMRender.direct = True
+    results = []
+    for size in sizes:
+        table = BenchTable()
+        table.root = table
+        table.mount()
+        start = time.perf_counter()
+        for i in range(size):
+            row = HTMLComp('TR')
+            table.add(row)
+            table._add_cid(row, 'row%s' % i)
+        added = time.perf_counter()
+        table.query(cid='row%s' % (size - 1))
+        queried = time.perf_counter()
+        table.remove_all()
+        removed = time.perf_counter()
+        print("%6d children  add %5.2f us  query %5.2f us  remove_all %5.2f us (per child)" % (
+            size, (added - start) / size * 1e6, (queried - added) / size * 1e6, (removed - queried) / size * 1e6))
+        results.append((size, added - start, queried - added, removed - queried))
+    return results
+
+
+def bench_teardown(rows=10000):
+    """
+    Clearing a rows table removing rows one by one vs remove_all. Both share
+    the teardown walk, so in CPython they take about the same time; what
+    remove_all saves is 9999 DOM writes, which the headless DOM doesn't price.
+    """
+    initialize_comps_classes()
+    BrowserDOMRender.direct = True
+    results = []
+    for bulk in (False, True):
+        table = BenchTable()
+        table.root = table
+        table.mount()
+        body = table.get('body')
+        refs = len(RefMap.ref)
+        for i in range(rows):
+            row = BenchRow()
+            row.n = i
+            body.add(row)
+        gc.collect()
+        with DOMCallCounter(DOMCallCounter.REMOVALS) as counter:
+            start = time.perf_counter()
+            if bulk:
+                body.remove_all()
+            else:
+                for row in list(body.children):
+                    body.remove(row)
+            elapsed = time.perf_counter() - start
+        name = 'remove_all' if bulk else 'remove each'
+        print("%-12s %8.1f ms  %6d DOM removals  %6d RefMap entries left" % (
+            name, elapsed * 1000, counter.calls, len(RefMap.ref) - refs))
+        results.append((name, elapsed, counter.calls))
+    return results
+
+
+def bench_search(items=100000, query='item 9876', pasted=200):
+    """
+    Filtering items strings: rescanning vs SearchIndex (ms per query). Typing
+    query char by char narrows the previous results, pasting new queries
+    (none contains the previous one) starts from the n-gram candidates.
+    """
+    import random
+    from components.custom import SearchIndex
+    values = ['Item %s' % i for i in range(items)]
+    typed = [query[:i] for i in range(1, len(query) + 1)] + [query[:i] for i in range(len(query) - 1, -1, -1)]
+    rng = random.Random(1)
+    queries = ['%d' % rng.randint(1000, items - 1) for i in range(pasted)]
+
+    def rescan(value):
+        value = value.lower()
+        return [x for x in values if value in x.lower() or not len(value)]
+
+    results = []
+    for name, ngram in (('rescan', None), ('index', 0), ('index ngram=3', 3)):
+        gc.collect()
+        tracemalloc.start()
+        search = rescan if ngram is None else SearchIndex(values, ngram).search
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        timings = []
+        for workload in (typed, queries):
+            start = time.perf_counter()
+            for value in workload:
+                search(value)
+            timings.append((time.perf_counter() - start) / len(workload))
+        print("%-14s typed %7.2f ms/query  pasted %7.2f ms/query  index %6d KB" % (
+            name, timings[0] * 1000, timings[1] * 1000, size / 1024))
+        results.append((name, timings[0], timings[1], size))
+    return results
+
+
+def bench_startup(number=20):
+    """Template instructions at startup: parsed with the DOMParser vs loaded from the bundle (build.py)"""
+    import build
+    from components import TemplateProcessor
+    templates = []
+    for name, fpath, is_package in build.collect_modules([build.PACKAGE_DIR, os.path.join(build.ROOT, 'examples')]):
+        with open(fpath) as f:
+            templates.extend(t for t in build.find_templates(f.read()) if t not in templates)
+    source = build.precompiled_module(templates).replace('from .base import', 'from components.base import')
+
+    def parse():
+        tp = TemplateProcessor(hoist_static=True)
+        for template in templates:
+            tp.parse(template)
+
+    def load():
+        exec(compile(source, 'components/_precompiled.py', 'exec'), {})
+
+    results = []
+    for name, func in (('parse', parse), ('bundle', load)):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3)) / number
+        print("%-7s %7.2f ms for %d templates" % (name, elapsed * 1000, len(templates)))
+        results.append((name, elapsed))
+    return results
+
+
+def bench_replay(items=2000, query='item 19'):
+    """Records typing and deleting a query in a FilteredList and replays the trace"""
+    from components.custom import FilteredList
+    from components.recorder import Recorder, replay
+    initialize_comps_classes()
+    BrowserDOMRender.direct = True
+    values = ['Item %s' % i for i in range(items)]
+    flist = FilteredList()
+    flist.root = flist
+    flist.mount()
+    flist.initial_items = values
+    with Recorder(flist) as recorder:
+        for i in list(range(1, len(query) + 1)) + list(range(len(query) - 1, -1, -1)):
+            flist.filtervalue = query[:i]
+    stats = replay(recorder.trace(), FilteredList, initial_items=values)
+    print("%d entries replayed in %.1f ms (%d missing)" % (stats['entries'], stats['ms'], stats['missing']))
+    return stats
+
+
+def _traced_size():
+    """Bytes traced by tracemalloc and still alive, without the headless DOM"""
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, headless.__file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+    return sum(stat.size for stat in snapshot.statistics('filename'))
+
+
+def _traced(func):
+    """Bytes allocated by func() and still alive"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return _traced_size()
+    finally:
+        tracemalloc.stop()
+
+
+def _example_class(module, name):
+    namespace = {}
+    exec(module.CODE[0], namespace)
+    return namespace[name]
+
+
+def _memory_cases():
+    """{case: factory(i) returning a component to mount}"""
+    headless.install()  # editor.py and the examples import browser
+    import editor
+    from examples import helloworld, timer
+    from components.custom import FilteredList, ListItem
+    hello_cls = _example_class(helloworld, 'MyComponent')
+    timer_cls = _example_class(timer, 'MyComponent')
+    initialize_comps_classes()
+
+    def filtered_list(i):
+        comp = FilteredList()
+        comp.initial_items = ['Item %s' % j for j in range(10)]
+        return comp
+
+    def list_item(i):
+        comp = ListItem()
+        comp.text = 'Item %s' % i
+        return comp
+
+    return {'Component (helloworld MyComponent)': lambda i: hello_cls(),
+            'Component (timer MyComponent)': lambda i: timer_cls(),
+            'FilteredList (10 items)': filtered_list,
+            'ListItem': list_item,
+            'ResultComponent': lambda i: editor.ResultComponent(),
+            'HTMLComp': lambda i: HTMLComp('DIV')}
+
+
+def _mounted_memory(factory, n):
+    """
+    (bytes per mounted instance, bytes per instance retained after
+    remove_all), measured from the end of a first round that fills the
+    class caches (templates) and grows the storage dicts.
+    """
+    table = BenchTable()
+    table.root = table
+    table.mount()
+    body = table.get('body')
+
+    def mount():
+        for i in range(n):
+            body.add(factory(i))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        mount()
+        body.remove_all()
+        base = _traced_size()
+        mount()
+        size = _traced_size() - base
+        body.remove_all()
+        retained = _traced_size() - base
+    finally:
+        tracemalloc.stop()
+    return size / float(n), retained / float(n)
+
+
+def _dynode_memory(n):
+    root = BenchObj()
+    root.root = root
+    expr = compile_expr('root.a')
+    props2bind = [['root', 'a']]
+    elems = [headless.document.createElement('DYNODE') for i in range(n)]
+    nodes = []
+
+    def dynodes():
+        for elem in elems:
+            node = DynNode('DYNODE', elem)
+            node.parent = node.root = root
+            node.bind_expression('html', expr, props2bind)
+            nodes.append(node)
+    return _traced(dynodes) / float(n)
+
+
+def _value_memory(n):
+    objs = [BenchObj() for i in range(n)]
+
+    def values():
+        for i, obj in enumerate(objs):
+            obj.b = i + 1000  # Not cached small ints
+    return _traced(values) / float(n)
+
+
+MEMORY_CASES = ('Component (helloworld MyComponent)', 'Component (timer MyComponent)', 'FilteredList (10 items)',
+                'ListItem', 'ResultComponent', 'HTMLComp', 'DYNODE binding', 'Property value')
+
+
+def _memory_case(args):
+    """(case, bytes per instance, retained per instance or None), run in a new process"""
+    name, n = args
+    BrowserDOMRender.direct = True
+    if name == 'DYNODE binding':
+        return name, _dynode_memory(n), None
+    if name == 'Property value':
+        return name, _value_memory(n), None
+    return (name,) + _mounted_memory(_memory_cases()[name], n)
+
+
+def bench_memory(n=500, budget_file=MEMORY_BUDGET):
+    """
+    Bytes per instance (tracemalloc, headless DOM excluded) of representative
+    components, a DYNODE binding and a Property value, and bytes per instance
+    retained after removal. Each case runs in a new process, so results don't
+    depend on what ran before. Fails when budget_file ({case: {"bytes": max,
+    "retained": max}}) is exceeded.
+    """
+    with get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        results = pool.map(_memory_case, [(name, n) for name in MEMORY_CASES], chunksize=1)
+
+    budget = {}
+    if budget_file is not None and os.path.exists(budget_file):
+        with open(budget_file) as f:
+            budget = json.load(f)
+    for name, size, retained in results:
+        limits = budget.get(name, {})
+        over = [key for key, value in (('bytes', size), ('retained', retained))
+                if value is not None and key in limits and value > limits[key]]
+        print("%-36s %8.0f bytes/instance  %8s retained/instance  %s" % (
+            name, size, '-' if retained is None else '%.0f' % retained,
+            'OVER BUDGET (%s)' % ', '.join(over) if over else ''))
+        if over:
+            FAILURES.append(name)
+    return results
+
+
+BENCHMARKS = {'callbacks': bench_callbacks, 'nodes': bench_nodes, 'pool': bench_pool,
+              'children': bench_children, 'teardown': bench_teardown,
+              'search': bench_search, 'startup': bench_startup, 'replay': bench_replay, 'memory': bench_memory}
+
+
+def main(argv):
+    names = argv or sorted(BENCHMARKS)
+    for name in names:
+        print("== %s" % name)
+        BENCHMARKS[name]()
+    if FAILURES:
+        print("Over budget: %s" % ', '.join(FAILURES))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,253 @@
+"""
+Build tools for components. Run with CPython (3.9+):
+
+    python build.py strip [--output DIR]
+    python build.py bundle [--strip] [--output FILE] [PATH ...]
+
+strip: Writes a production copy of the components package to DIR (default
+dist/) with debug logging and debug checks removed:
+    - pprint(...) statements (except pprint(..., force=True)) and log.debug(...) statements
+    - `if log.enabled:`, `if dom_stats.enabled:`, `if CONSOLE_ENABLED:` and
+      `if DEBUG:` blocks
+
+bundle: Packs the components package, the user component modules in PATH
+(.py files or package directories, relative to this directory) and the
+pre-parsed instructions of every `template` found in them into a single
+Brython VFS file (default dist/components.vfs.js). Load it in the page before
+brython.js runs the scripts:
+    <script type="text/javascript" src="/src/brython.js"></script>
+    <script type="text/javascript" src="dist/components.vfs.js"></script>
+Modules are then imported from memory (no request per module) and
+templates skip the DOMParser.
+"""
+import argparse
+import ast
+import json
+import os
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(ROOT, 'components')
+
+DEBUG_GUARDS = ('CONSOLE_ENABLED', 'DEBUG', 'log.enabled', 'dom_stats.enabled')
+
+
+def _name(node):
+    """Dotted name of a Name/Attribute node, None for anything else"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _name(node.value)
+        return None if base is None else "%s.%s" % (base, node.attr)
+    return None
+
+
+class DebugStripper(ast.NodeTransformer):
+    """Removes logging calls and debug guarded blocks"""
+
+    def __init__(self):
+        self.removed = 0
+
+    def _is_log_call(self, node):
+        if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+            return False
+        call = node.value
+        name = _name(call.func)
+        if name == 'log.debug':
+            return True
+        if name == 'pprint':
+            # Forced messages are always printed, keep them
+            return not any(k.arg == 'force' for k in call.keywords)
+        return False
+
+    def _is_debug_guard(self, node):
+        return isinstance(node, ast.If) and _name(node.test) in DEBUG_GUARDS
+
+    def _strip_body(self, body):
+        new_body = []
+        for stmt in body:
+            if self._is_log_call(stmt):
+                self.removed += 1
+                continue
+            if self._is_debug_guard(stmt):
+                self.removed += 1
+                new_body.extend(self._strip_body(stmt.orelse))
+                continue
+            new_body.append(self.visit(stmt))
+        return new_body
+
+    def generic_visit(self, node):
+        for field in ('body', 'orelse', 'finalbody'):
+            body = getattr(node, field, None)
+            if isinstance(body, list) and body and isinstance(body[0], ast.stmt):
+                new_body = self._strip_body(body)
+                # Keep blocks syntactically valid
+                if not new_body and (field == 'body' or not isinstance(node, (ast.If, ast.For, ast.While, ast.Try))):
+                    new_body = [ast.Pass()]
+                setattr(node, field, new_body)
+        for handler in getattr(node, 'handlers', []):
+            self.generic_visit(handler)
+        return node
+
+    def visit_Assign(self, node):
+        # DEBUG = True -> DEBUG = False
+        if (len(node.targets) == 1 and _name(node.targets[0]) == 'DEBUG'
+                and isinstance(node.value, ast.Constant)):
+            node.value = ast.Constant(False)
+        return node
+
+
+def strip_source(source):
+    """Returns (stripped source, number of removed statements)"""
+    tree = ast.parse(source)
+    stripper = DebugStripper()
+    tree = stripper.visit(tree)
+    ast.fix_missing_locations(tree)
+    return ast.unparse(tree) + '\n', stripper.removed
+
+
+def strip(output):
+    dest = os.path.join(output, 'components')
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+    for fname in sorted(os.listdir(PACKAGE_DIR)):
+        if not fname.endswith('.py'):
+            continue
+        with open(os.path.join(PACKAGE_DIR, fname)) as f:
+            source, removed = strip_source(f.read())
+        with open(os.path.join(dest, fname), 'w') as f:
+            f.write(source)
+        print("%-20s %3d debug statements removed" % (fname, removed))
+    return dest
+
+
+def _module_name(path):
+    rel = os.path.relpath(os.path.abspath(path), ROOT)
+    name = rel[:-3] if rel.endswith('.py') else rel
+    return name.replace(os.sep, '.')
+
+
+def collect_modules(paths):
+    """Returns [(module name, file path, is package)] for .py files and package dirs in paths"""
+    modules = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '__')))
+                for fname in sorted(filenames):
+                    if not fname.endswith('.py'):
+                        continue
+                    fpath = os.path.join(dirpath, fname)
+                    if fname == '__init__.py':
+                        modules.append((_module_name(dirpath), fpath, True))
+                    else:
+                        modules.append((_module_name(fpath), fpath, False))
+        else:
+            modules.append((_module_name(path), path, False))
+    return modules
+
+
+def find_templates(source):
+    """Returns the `template` string literals assigned in class bodies"""
+    templates = []
+    for node in ast.walk(ast.parse(source)):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for stmt in node.body:
+            if (isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Constant)
+                    and isinstance(stmt.value.value, str) and stmt.value.value.strip()
+                    and any(_name(t) == 'template' for t in stmt.targets)):
+                templates.append(stmt.value.value)
+    return templates
+
+
+def serialize_instructions(instructions):
+    """Python source of an instructions set. Compiled expressions become E(source)"""
+    if isinstance(instructions, list):
+        return '[%s]' % ', '.join(serialize_instructions(x) for x in instructions)
+    if isinstance(instructions, tuple):
+        items = [serialize_instructions(x) for x in instructions]
+        return '(%s)' % (items[0] + ',' if len(items) == 1 else ', '.join(items))
+    if callable(instructions):
+        return 'E(%r)' % (instructions.expression,)
+    return repr(instructions)
+
+
+def precompiled_module(templates):
+    from components import TemplateProcessor
+    # Components hoist static subtrees by default (Component.hoist_static)
+    tp = TemplateProcessor(hoist_static=True)
+    lines = ['"""Generated by build.py bundle. Do not edit."""',
+             'from .base import compile_expr as E', '', 'TEMPLATES = {']
+    for template in templates:
+        try:
+            instructions = tp.parse(template)
+        except Exception as e:
+            print("WARNING template not pre-parsed (%s): %r" % (e, template[:40]))
+            continue
+        lines.append('    %r:\n        %s,' % (template, serialize_instructions(instructions)))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+# Modules only used under CPython (server imports the headless DOM). A page that
+# imports one anyway gets it from the server as without a bundle
+CPYTHON_ONLY = ('components.headless', 'components.server', 'components.recorder', 'components.profiler')
+
+
+def bundle(paths, output, strip_debug=False):
+    modules = [m for m in collect_modules([PACKAGE_DIR] + list(paths))
+               if m[0] not in CPYTHON_ONLY]
+    vfs = {}
+    templates = []
+    for name, fpath, is_package in modules:
+        with open(fpath) as f:
+            source = f.read()
+        for template in find_templates(source):
+            if template not in templates:
+                templates.append(template)
+        if strip_debug:
+            source = strip_source(source)[0]
+        # Brython VFS entries: [ext, source, imports, is_package]
+        vfs[name] = ['.py', source, [], 1] if is_package else ['.py', source]
+    vfs['components._precompiled'] = ['.py', precompiled_module(templates)]
+
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        f.write('// Generated by build.py bundle. Do not edit.\n')
+        f.write('__BRYTHON__.use_VFS = true;\n')
+        f.write('__BRYTHON__.components_bundle = true;\n')
+        f.write('(function(VFS){\n    var modules = %s;\n' % json.dumps(vfs, indent=0))
+        f.write('    for(var name in modules){VFS[name] = modules[name]}\n')
+        f.write('})(__BRYTHON__.VFS = __BRYTHON__.VFS || {});\n')
+    print("%s: %d modules, %d pre-parsed templates, %d bytes" % (
+        output, len(vfs), len(templates), os.path.getsize(output)))
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    cmd_strip = commands.add_parser('strip', help='production copy without debug logging')
+    cmd_strip.add_argument('--output', default=os.path.join(ROOT, 'dist'))
+    cmd_bundle = commands.add_parser('bundle', help='single file VFS bundle with pre-parsed templates')
+    cmd_bundle.add_argument('paths', nargs='*', help='user component modules (.py files or packages)')
+    cmd_bundle.add_argument('--output', default=os.path.join(ROOT, 'dist', 'components.vfs.js'))
+    cmd_bundle.add_argument('--strip', action='store_true', help='remove debug logging (see strip)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'strip':
+        strip(args.output)
+    elif args.command == 'bundle':
+        bundle(args.paths, args.output, args.strip)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,5 @@
-from .base import Property, Component, ObjectWithProperties, Register, HTMLComp, TemplateProcessor, init, render, initialize_comps_classes, BrowserDOMRender, compile_expr, RefMap, get_props2bind
+from .base import Property, Component, ObjectWithProperties, Register, HTMLComp, TemplateProcessor, init, render, initialize_comps_classes, BrowserDOMRender, compile_expr, RefMap, get_props2bind, log, load_precompiled_templates, IncrementalMount, scheduler, set_interval, set_timeout, clear_interval, Clock, clock, IMMEDIATE, USER_BLOCKING, NORMAL, IDLE, HTML_TAGS, HTMLFragment, InstructionCache, html_cache, HTMLNode, DynNode, DOMStats, dom_stats
 
-# TODO Future: To load a precompiled version of components.base (See ticket #222 in Brython repo)
-"""
-import sys
-# Ensure that VFS path finder is installed
-from _importlib import VFSPathFinder
-if VFSPathFinder not in sys.path_hooks:
-    sys.path_hooks.insert(0, VFSPathFinder)
-    print('WARNING: VFS path hook installed')
-else:
-    print('INFO: VFS path finder already installed')
-
-orig_path = list(sys.path)
-# Override VFS entry in sys.path
-vfs_pyc_url =  'http://localhost:8000/demo/components/base.vfs.js'
-sys.path[0] = vfs_pyc_url
-from base_pyc import  Property, Component, ObjectWithProperties, Register, HTMLComp, TemplateProcessor, init, BrowserDOMRender
-
-#Restore
-sys.path = orig_path
-"""
+# Bundled build (build.py bundle): modules are served from Brython's VFS, so the
+# whole package is loaded with a single <script> fetch, and templates come pre-parsed.
+load_precompiled_templates()
@@ -19,6 +19,7 @@ DOMEVENTS = ('onclick',
              'onkeyup',)
 
 DYNODE = 'DYNODE'
+STATIC = 11  # Static subtrees: [STATIC, instructions, DocumentFragment or None]
 NORMAL_ATTR, EVENT_ATTR, DYN_ATTR = 1, 2, 3
 
 HTML_TAGS = ['A', 'ABBR', 'ACRONYM', 'ADDRESS', 'APPLET', 'AREA', 'B', 'BASE',
@@ -42,6 +43,18 @@ HTML_TAGS = ['A', 'ABBR', 'ACRONYM', 'ADDRESS', 'APPLET', 'AREA', 'B', 'BASE',
              # HTML5.1 tags
              'DETAILS', 'DIALOG', 'MENUITEM', 'PICTURE', 'SUMMARY']
 
+try:
+    from weakref import WeakMethod, ref
+    HAS_WEAKREF = True
+except ImportError:
+    # Observers will be strong references
+    class WeakMethod(object):
+        pass
+
+    def ref(obj):
+        return lambda: obj
+    HAS_WEAKREF = False
+
 class RefMap(object):
     """Holds references to all components"""
     ref = {}
@@ -49,8 +62,9 @@ class RefMap(object):
     @classmethod
     def add(cls, obj):
         id_ = id(obj)
-        if id_ in RefMap.ref and obj is not RefMap.ref[id_]:
-            print("WARNING Refmap already has object ", obj, "it'll be dereferenced because of", RefMap.ref[id_])
+        if DEBUG:
+            if id_ in RefMap.ref and obj is not RefMap.ref[id_]:
+                print("WARNING Refmap already has object ", obj, "it'll be dereferenced because of", RefMap.ref[id_])
 
         RefMap.ref[id_] = obj
         return id_
@@ -75,15 +89,39 @@ class ObserverAlreadyRegistered(Exception):
     pass
 
 
+def _observer_key(observer):
+    """Returns the key used to identify (and dedupe) an observer.
+    Bound methods are created on each attribute access, so they are keyed by
+    (owner id, function) instead of by identity."""
+    owner = getattr(observer, '__self__', None)
+    func = getattr(observer, '__func__', None)
+    if owner is not None and func is not None:
+        return (id(owner), func)
+    return observer
+
+
+def _observer_ref(observer):
+    """Returns a weak reference for bound methods (so observers don't keep
+    their owners alive) or the observer itself for any other callable."""
+    if HAS_WEAKREF and getattr(observer, '__func__', None) is not None:
+        try:
+            return WeakMethod(observer)
+        except TypeError:
+            pass
+    return observer
+
+
 class Property(object):
 
     """
     Property object that implements observer pattern. Use it in Component objects.
     Values are stored in an internal dictionary using object.iid as key.
-    Observers (binded callback functions) are stored in a similar way.
+    Observers (binded callback functions) are stored in a similar way, as an
+    ordered dict {observer key: observer or weak method} per instance so
+    registration, removal and dedupe are O(1).
     """
     defaultvalue = None
-    observers = None  # List of observers
+    observers = None  # Dict of observers per instance iid
     storage = None
 
     def __init__(self, *args, **kwargs):
@@ -116,7 +154,8 @@ class Property(object):
         return self.value
 
     def __set__(self, instance, value):
-        pprint(("SET", value, instance))
+        if log.enabled:
+            log.debug("SET", value, instance)
         iid = instance.iid
         if iid in self.storage:
             oldvalue = self.storage[iid]
@@ -124,34 +163,62 @@ class Property(object):
             # for lists and objects
             if value != oldvalue:
                 self.storage[iid] = value
-                self.notify_observers(iid, instance, value)
+                if scheduler.deferring:
+                    scheduler.defer(self, instance)
+                else:
+                    self.notify_observers(iid, instance, value)
 
         else:
             self.storage[iid] = value
-            self.notify_observers(iid, instance, value)
+            if scheduler.deferring:
+                scheduler.defer(self, instance)
+            else:
+                self.notify_observers(iid, instance, value)
 
     def reg_observer(self, instance, observer):
         iid = instance.iid
+        key = _observer_key(observer)
         if iid in self.observers:
-            if observer not in self.observers[iid]:
-                self.observers[iid].append(observer)
+            obs = self.observers[iid]
+            current = obs.get(key)
+            # Re-register if the key belongs to a dead weak method (id reused)
+            if current is None or (isinstance(current, WeakMethod) and current() is None):
+                obs[key] = _observer_ref(observer)
         else:
-            self.observers[iid] = [observer]
+            self.observers[iid] = {key: _observer_ref(observer)}
 
     def unreg_observer(self, instance, observer):
         iid = instance.iid
         try:
-            l = self.observers[iid]
-            del l[l.index(observer)]
+            del self.observers[iid][_observer_key(observer)]
         except:
             pprint("Cannot unregister observer", observer, ". Not registered.")
 
     def notify_observers(self, iid, instance, value):
         if iid not in self.observers:
             return
-        obs_list = self.observers[iid]
-        for observer in obs_list:
+        if dom_stats.enabled and dom_stats.trigger is None:
+            return dom_stats.notify(self, iid, instance, value)
+        obs = self.observers[iid]
+        dead = None
+        # Iterate over a snapshot, observers may bind/unbind while notified
+        for key, observer in list(obs.items()):
+            if isinstance(observer, WeakMethod):
+                observer = observer()
+                if observer is None:
+                    if dead is None:
+                        dead = []
+                    dead.append(key)
+                    continue
+            elif observer.__class__ is ChainPropBinding and observer.owner is None:
+                if dead is None:
+                    dead = []
+                dead.append(key)
+                continue
             observer(value, instance)
+        if dead is not None:
+            for key in dead:
+                obs.pop(key, None)
 
     def force_change(self, instance):
         """
@@ -168,6 +235,7 @@ class ObjectWithProperties(object):
 
     cnt = 0
     iid = None
+    _bindings = None  # [(source, propname, observer)] registered by update_with_expression
 
     def __init__(self):
         self.cnt = ObjectWithProperties.cnt
@@ -208,9 +276,14 @@ class ObjectWithProperties(object):
         for prop in props2bind:
             try:
                 objname, propname = prop
-                RefMap.get(context[objname]).bind(propname, cbackp)
+                source = RefMap.get(context[objname])
+                source.bind(propname, cbackp)
             except Exception as e:
                 print("error binding", e)
+            else:
+                if self._bindings is None:
+                    self._bindings = []
+                self._bindings.append((source, propname, cbackp))
 
         # Call manually to set an initial value
         self._chain_prop(None, self, property_name, expression, context, obj)
@@ -218,7 +291,7 @@ class ObjectWithProperties(object):
     def chain_prop_cback(self, propname, expression, context, objref=None):
         """returns a proper callback  that updates self.propname with evaluated expression, to be binded to a property.
         """
-        return partial(self._chain_prop, propname=propname, expression=expression, context=context, objref=objref)
+        return ChainPropBinding(self, propname, expression, context, objref)
 
     def _chain_prop(self, value, instance, propname, expression, context, objref):
         # assign
@@ -228,7 +301,10 @@ class ObjectWithProperties(object):
         context_this= RefMap.get(context['this'])
         v = expression(context_root, context_parent, context_self, context_this)
 
-        setattr(RefMap.get(objref), propname, v)
+        obj = RefMap.get(objref)
+        if dom_stats.enabled and not isinstance(obj, ObjectWithProperties):
+            dom_stats.count('setAttribute', self)
+        setattr(obj, propname, v)
 
     def force_change(self, propname):
         getattr(self.__class__, propname).force_change(self)
@@ -236,6 +312,174 @@ class ObjectWithProperties(object):
     def _get_attr(self, attrname):
         return getattr(self, attrname)
 
+# Priority lanes
+IMMEDIATE, USER_BLOCKING, NORMAL, IDLE = 0, 1, 2, 3
+
+
+class Scheduler(object):
+    """
+    Schedules property propagation and rendering by priority lane.
+    Work runs in the lane of its origin (see run_with_priority):
+    IMMEDIATE (default) and USER_BLOCKING (DOM events) propagate property
+    changes synchronously. NORMAL and IDLE (timers) changes are stored at once
+    but their observers are notified in the next animation frame, coalesced
+    per property and instance: NORMAL first, then IDLE only while the frame
+    budget (ms) isn't spent, unless IDLE work has waited idle_timeout ms.
+    Render jobs are run first in each frame, in order (DOM order depends on it).
+    """
+    frame_budget = 8
+    idle_timeout = 1000
+
+    def __init__(self):
+        self.priority = IMMEDIATE
+        # True when property changes must be queued instead of notified
+        self.deferring = False
+        self.flushing = False
+        self.renders = []
+        self.queues = {NORMAL: {}, IDLE: {}}
+        self.idle_since = None
+        self.frame_requested = False
+
+    def run_with_priority(self, priority, func, *args):
+        """Runs func(*args) in lane priority"""
+        prev = self.priority
+        self.priority = priority
+        self.deferring = priority >= NORMAL and not self.flushing
+        try:
+            return func(*args)
+        finally:
+            self.priority = prev
+            self.deferring = prev >= NORMAL and not self.flushing
+
+    def wrap(self, func, priority):
+        """Returns a callback that runs func in lane priority"""
+        def callback(*args):
+            return self.run_with_priority(priority, func, *args)
+        return callback
+
+    def defer(self, prop, instance):
+        queue = self.queues[self.priority if self.priority in self.queues else NORMAL]
+        queue[(id(prop), instance.iid)] = (prop, instance)
+        if self.priority == IDLE and self.idle_since is None:
+            self.idle_since = now_ms()
+        self.request_frame()
+
+    def schedule_render(self, job):
+        self.renders.append(job)
+        self.request_frame()
+
+    def request_frame(self):
+        if not self.frame_requested:
+            self.frame_requested = True
+            window.requestAnimationFrame(self._frame)
+
+    def pending(self):
+        return len(self.renders) + len(self.queues[NORMAL]) + len(self.queues[IDLE])
+
+    def _frame(self, ev=None):
+        self.frame_requested = False
+        self.flush(self.frame_budget)
+        if self.pending():
+            self.request_frame()
+
+    def flush(self, budget=None):
+        """Runs pending work: renders, NORMAL lane and IDLE lane (within budget ms
+        since the call, None for no limit)"""
+        start = now_ms()
+        self.flushing = True
+        self.deferring = False
+        try:
+            renders, self.renders = self.renders, []
+            for job in renders:
+                job()
+            self._flush_queue(NORMAL)
+            idle = self.queues[IDLE]
+            overdue = self.idle_since is not None and start - self.idle_since >= self.idle_timeout
+            while idle and (budget is None or overdue or now_ms() - start < budget):
+                key = next(iter(idle))
+                prop, instance = idle.pop(key)
+                self._notify(prop, instance, IDLE)
+            if not idle:
+                self.idle_since = None
+        finally:
+            self.flushing = False
+            self.deferring = self.priority >= NORMAL
+
+    def _flush_queue(self, priority):
+        queue = self.queues[priority]
+        self.queues[priority] = {}
+        for prop, instance in queue.values():
+            self._notify(prop, instance, priority)
+
+    def _notify(self, prop, instance, priority):
+        prev = self.priority
+        self.priority = priority
+        try:
+            prop.force_change(instance)
+        finally:
+            self.priority = prev
+
+scheduler = Scheduler()
+
+
+def set_interval(callback, ms, priority=IDLE):
+    """window.setInterval running callback in lane priority (background by default)"""
+    return window.setInterval(scheduler.wrap(callback, priority), ms)
+
+
+def set_timeout(callback, ms, priority=IDLE):
+    """window.setTimeout running callback in lane priority (background by default)"""
+    return window.setTimeout(scheduler.wrap(callback, priority), ms)
+
+
+def clear_interval(timer_id):
+    window.clearInterval(timer_id)
+
+
+class Clock(object):
+    """
+    Shared timers: subscribers to the same period share one window interval.
+    A tick calls every subscriber of the period in one batch in lane priority,
+    so their property changes are propagated together in the next frame.
+    Components subscribe with every(), released when they're unmounted.
+    """
+
+    def __init__(self, priority=IDLE):
+        self.priority = priority
+        self.periods = {}  # {ms: (timer_id, {key: callback})}
+        self.next_key = 0
+
+    def subscribe(self, ms, callback):
+        """Calls callback() every ms. Returns the key to unsubscribe"""
+        period = self.periods.get(ms)
+        if period is None:
+            timer_id = window.setInterval(ClockTick(self, ms), ms)
+            period = self.periods[ms] = (timer_id, {})
+        self.next_key += 1
+        period[1][self.next_key] = callback
+        return self.next_key
+
+    def unsubscribe(self, ms, key):
+        period = self.periods.get(ms)
+        if period is not None:
+            period[1].pop(key, None)
+            if not period[1]:
+                clear_interval(period[0])
+                del self.periods[ms]
+
+    def _tick(self, ms):
+        period = self.periods.get(ms)
+        if period is None:
+            return
+        for callback in list(period[1].values()):
+            try:
+                callback()
+            except Exception as e:
+                print("error in clock callback", e)
+
+clock = Clock()
+
+
 class DOMRender(object):
     """Class used to render DOM"""
     pass
@@ -248,10 +492,13 @@ class BrowserDOMRender(DOMRender):
         if BrowserDOMRender.direct:
             self._render(None, comp, before, after)
         else:
-            window.requestAnimationFrame(
-                partial(self._render, comp=comp, before=before, after=after))
+            scheduler.schedule_render(RenderJob(self, comp, before, after))
 
     def _render(self, ev, comp, before=None, after=None):
+        if comp.elem is None or comp.parent is None:
+            return  # Removed before its render job ran
+        if dom_stats.enabled:
+            dom_stats.count('appendChild' if before is None and after is None else 'insertBefore', comp)
         if before is not None:
             comp.parent.elem.insertBefore(comp.elem, before.elem)
         elif after is not None:
@@ -266,23 +513,36 @@ class BaseComponent(ObjectWithProperties):
     rendertag = None  # Tag used to render the component in DOM
     # Template string is parsed and compiled into a set of instructions
     instructions = []
-    children = None  # Children Components
+    children = None  # Children Components (ChildList)
+    cid = None  # cid in the template, if any (key in root.ids)
+    _query_cache = None
     parent = None  # Parent Component.
     # Root component (The first component that initiated the mount)
     root = None
     is_mounted = Property(False)
     dom_renderer = BrowserDOMRender()
+    pool_size = 0  # Removed instances kept for reuse by acquire()
     elem = None  # DOMNode
-    
+    # Hydration: prerendered DOM child nodes still to be adopted by children
+    _hydrating = False
+    _adopt_nodes = None
+    _adopted = False  # elem was adopted, already in place in the DOM
+    _statics = None  # StaticBlocks inserted from STATIC instructions
+    _events = None  # [(eventname, callback)] bound to elem
+    _ticks = None  # [(ms, key)] clock subscriptions (see every)
+
     def __init__(self, domnode=None):
         super(BaseComponent, self).__init__()
-        self.children = []
+        self.children = ChildList()
         if domnode == None:
-            tag = self.tag if self.rendertag is None else self.rendertag
-            self.elem = self._create_domelem(tag)
+            self.elem = self._new_domelem()
         else:
             self.elem = domnode
 
+    def _new_domelem(self):
+        tag = self.tag if self.rendertag is None else self.rendertag
+        return self._create_domelem(tag)
+
     def __repr__(self):
         return "%s tag: %s id: %s iid: %s"%(self.__class__.__name__, self.tag, id(self), self.iid)
 
@@ -292,110 +552,166 @@ class BaseComponent(ObjectWithProperties):
     def parse_instructions(self):
         parentcomp = self
         instruction_set = self.instructions
-        context_root = RefMap.get(self.context['root'])
+        context_root = self.root
 
         for instruction in instruction_set:
-            type_ = instruction[0]
-            cid = None
-            if type_ == TEXT:
-                txt = instruction[1]
-                comp = self.create_component('text', txt)
-                comp.is_mounted = True
-            else:
-                nodename = instruction[1]
-                attributes = instruction[2]
-                # Get cid if present
-                try:
-                    for x in attributes:
-                        if x[0] == 'cid':
-                            cid = x[1]
-                            break
-                except:
-                    cid = None
-                if nodename in Register._reg_names: 
-                    pprint("CREATE custom component, named", nodename)
-                    try:
-                        comp = Register.get_component_class(nodename)()
-                        # TODO We don't set domnode attributes based on template, only comp,, should we?
-                        comp.root = comp #Custom comps are their own root
-                        comp.parent = self
-
-                        comp.mount()
-
-                        # For attributes from DOM template to Comp use normal root for context
-                        comp.set_context(root=self.root)
-
-                        # Once mounted Set Comp's props initial values  from DOM template
-                        for attr in attributes:
-                            name, value, type_ = attr[0:3]
-                            if name == "cid":
-                                continue
-                            if (type_ == DYN_ATTR):
-                                expression = value
-                                props2bind = attr[3]
-                                comp.update_with_expression(name, expression, comp.context, comp, props2bind)
-                            else:
-                                setattr(comp, name, value)
-
-                        #Restore context
-                        comp.set_context(root=comp.root)
-
-                    except Exception as e:
-                        pprint("Couldnt add component ", nodename, e)
-
-                elif nodename == DYNODE:
-                    comp = self.create_component(nodename)
-                    expression = instruction[2]
-                    props2bind = instruction[3]
-                    # Bind all attributes in expression
-                    comp.update_with_expression(
-                        'html', expression, comp.context, comp, props2bind)
-                    comp.is_mounted = True
-                else:  # Components of classic HTML nodes
-                    comp = self.create_component(nodename)
-
-                    # Setting props from Component to DOM
-                    for attr in attributes:
-                        name, value, type_ = attr[0:3]
-
-                        if (type_ == DYN_ATTR):
-                            # Dyn
-
-                            # Check if is event or normal attribute
-                            expression = value
-                            if name not in DOMEVENTS:
-                                comp._dom_newattr(name, '')
-                                props2bind = attr[3]
-                                comp.update_with_expression(
-                                    name, expression, comp.context, comp.elem, props2bind)
-                            else:
-                                eventname = name[2:]
-                                comp.elem.bind(
-                                    eventname, comp.domevent_callback(expression, comp.context))
-
-                        else:
-                            # Normal attr
-                            comp._dom_newattr(name, value)
-
-                    child_instructions = instruction[3]
-                    comp.instructions = child_instructions
-                    comp.mount()
-            pprint("Adding COMP", comp, comp.tag)
+            comp, cid = self._create_from_instruction(instruction)
+            if comp is None:
+                continue
+            if not comp.is_mounted:
+                comp.mount()
+            if log.enabled:
+                log.debug("Adding COMP", comp, comp.tag)
 
             # Add comp to cid dict for quick retrieval
             context_root._add_cid(comp, cid)
             parentcomp.add(comp)
 
+    def _create_from_instruction(self, instruction):
+        """
+        Creates the child component described by instruction. Returns (comp, cid).
+        Components of classic HTML nodes are returned unmounted (their children
+        instructions are not processed yet); comp is None if it couldn't be created.
+        """
+        type_ = instruction[0]
+        cid = None
+        if type_ == TEXT:
+            txt = instruction[1]
+            comp = self._create_node('text', txt)
+            comp.is_mounted = True
+            return comp, cid
+        if type_ == STATIC:
+            self._add_static(instruction)
+            return None, cid
+
+        nodename = instruction[1]
+        attributes = instruction[2]
+        # Get cid if present
+        try:
+            for x in attributes:
+                if x[0] == 'cid':
+                    cid = x[1]
+                    break
+        except:
+            cid = None
+        if nodename in Register._reg_names:
+            if log.enabled:
+                log.debug("CREATE custom component, named", nodename)
+            try:
+                comp_cls = Register.get_component_class(nodename)
+                domnode = None
+                if self._adopt_nodes is not None:
+                    domnode = self._claim_domelem(comp_cls.tag if comp_cls.rendertag is None else comp_cls.rendertag)
+                comp = comp_cls(domnode)
+                if domnode is not None:
+                    comp._adopted = comp._hydrating = True
+                # TODO We don't set domnode attributes based on template, only comp,, should we?
+                comp.root = comp #Custom comps are their own root
+                comp.parent = self
+
+                comp.mount()
+
+                # For attributes from DOM template to Comp use normal root for context
+                comp.set_context(root=self.root)
+
+                # Once mounted Set Comp's props initial values  from DOM template
+                for attr in attributes:
+                    name, value, type_ = attr[0:3]
+                    if name == "cid":
+                        continue
+                    if (type_ == DYN_ATTR):
+                        expression = value
+                        props2bind = attr[3]
+                        comp.update_with_expression(name, expression, comp.context, comp, props2bind)
+                    else:
+                        setattr(comp, name, value)
+
+                #Restore context
+                comp.set_context(root=comp.root)
+
+            except Exception as e:
+                pprint("Couldnt add component ", nodename, e)
+                return None, cid
+
+        elif nodename == DYNODE:
+            comp = self._create_node(nodename, node_cls=DynNode)
+            comp.is_mounted = True
+            # Bind all attributes in expression
+            comp.bind_expression('html', instruction[2], instruction[3])
+        elif cid is None and not _has_events(attributes):
+            # Classic HTML node that doesn't need a component
+            comp = self._create_node(nodename)
+            for attr in attributes:
+                if attr[2] == DYN_ATTR:
+                    if dom_stats.enabled:
+                        dom_stats.count('setAttribute', comp)
+                    comp.elem.setAttribute(attr[0], '')
+                    comp.bind_expression(attr[0], attr[1], attr[3])
+                elif not comp._adopted:
+                    if dom_stats.enabled:
+                        dom_stats.count('setAttribute', comp)
+                    comp.elem.setAttribute(attr[0], attr[1])
+            comp.instructions = instruction[3]
+        else:  # Components of classic HTML nodes
+            comp = self.create_component(nodename)
+
+            # Setting props from Component to DOM
+            for attr in attributes:
+                name, value, type_ = attr[0:3]
+
+                if (type_ == DYN_ATTR):
+                    # Dyn
+
+                    # Check if is event or normal attribute
+                    expression = value
+                    if name not in DOMEVENTS:
+                        comp._dom_newattr(name, '')
+                        props2bind = attr[3]
+                        comp.update_with_expression(
+                            name, expression, comp.context, comp.elem, props2bind)
+                    else:
+                        eventname = name[2:]
+                        callback = comp.domevent_callback(expression, comp.context)
+                        if dom_stats.enabled:
+                            dom_stats.count('bind', comp)
+                        comp.elem.bind(eventname, callback)
+                        if comp._events is None:
+                            comp._events = []
+                        comp._events.append((eventname, callback))
+
+                elif not comp._adopted:
+                    # Normal attr (adopted nodes already have it)
+                    comp._dom_newattr(name, value)
+
+            child_instructions = instruction[3]
+            comp.instructions = child_instructions
+        return comp, cid
+
+    def _create_node(self, tag, text='', node_cls=None):
+        """Returns a new HTMLNode (or node_cls) child for tag (adopting a prerendered node when hydrating)"""
+        dom_elem = self._claim_domelem(tag, text) if self._adopt_nodes is not None else None
+        node = (node_cls or HTMLNode)(tag, dom_elem if dom_elem is not None else self._create_domelem(tag, text))
+        node._adopted = node._hydrating = dom_elem is not None
+        node.parent = self
+        node.root = self.root
+        return node
+
     def create_component(self, tag, text=''):
 
-        dom_elem = self._create_domelem(tag, text)
+        dom_elem = self._claim_domelem(tag, text) if self._adopt_nodes is not None else None
+        adopted = dom_elem is not None
+        if not adopted:
+            dom_elem = self._create_domelem(tag, text)
         c = HTMLComp(tag, dom_elem)
+        c._adopted = c._hydrating = adopted
         c.parent = self
         c.root = self.root
         c.set_context(c.root)
         return c
 
     def _create_domelem(self, tag, text=''):
+        if dom_stats.enabled:
+            dom_stats.count('createTextNode' if tag == 'text' else 'createElement', self)
         if tag == 'text':
             dom = document.createTextNode(text)
             dom_elem = window.__BRYTHON__.DOMNode(dom)
@@ -405,12 +721,94 @@ class BaseComponent(ObjectWithProperties):
         return dom_elem
 
 
+    def hydrate(self):
+        """Mounts the component adopting its prerendered DOM (see server.render_to_string)
+        instead of creating new elements. Bindings and events are wired to the
+        existing nodes."""
+        self._hydrating = True
+        return self.mount()
+
+    def _start_adopt(self):
+        if self._hydrating:
+            nodes = self.elem.childNodes
+            if self.children:
+                # Children added before mounting (e.g. by property callbacks) are kept
+                added = set(id(c.elem) for c in self.children)
+                nodes = [node for node in nodes if id(node) not in added]
+            self._adopt_nodes = list(nodes)
+
+    def _claim_domelem(self, tag, text=''):
+        """Returns the next prerendered child node if it matches tag, else None"""
+        nodes = self._adopt_nodes
+        if not nodes:
+            return None
+        node = nodes[0]
+        if _node_matches(node, tag, text if tag == 'text' else None):
+            del nodes[0]
+            return node
+        # Prerendered DOM doesn't match the template, drop the rest and create from here
+        self._end_adopt()
+        return None
+
+    def _claim_static(self, instructions):
+        """Returns the prerendered nodes of a static block if they match, else None"""
+        nodes = self._adopt_nodes
+        if not nodes:
+            return None
+        n = len(instructions)
+        if len(nodes) >= n:
+            for i in range(n):
+                if instructions[i][0] == TEXT:
+                    matches = _node_matches(nodes[i], 'text', instructions[i][1])
+                else:
+                    matches = _node_matches(nodes[i], instructions[i][1])
+                if not matches:
+                    break
+            else:
+                claimed = nodes[:n]
+                del nodes[:n]
+                return claimed
+        self._end_adopt()
+        return None
+
+    def _add_static(self, instruction):
+        """Inserts the nodes of a STATIC instruction in one operation (no components)"""
+        nodes = self._claim_static(instruction[1]) if self._adopt_nodes is not None else None
+        block = StaticBlock(self, nodes)
+        if nodes is None:
+            fragment = instruction[2]
+            if fragment is None:
+                # Built once per instruction, cloned for each use
+                fragment = document.createDocumentFragment()
+                _build_nodes(fragment, instruction[1])
+                instruction[2] = fragment
+            if dom_stats.enabled:
+                dom_stats.count('cloneNode', self)
+            block.elem = window.__BRYTHON__.DOMNode(fragment.cloneNode(True))
+            block.nodes = list(block.elem.childNodes)
+            self.dom_renderer.render(block)
+        if self._statics is None:
+            self._statics = []
+        self._statics.append(block)
+
+    def _end_adopt(self):
+        """Removes prerendered nodes that were not adopted (e.g. children added
+        imperatively in callbacks, which will be added again)"""
+        if self._adopt_nodes:
+            for node in self._adopt_nodes:
+                self.elem.removeChild(node)
+        self._adopt_nodes = None
+        self._hydrating = False
+
     def _mark_as_mounted(self):
-        self._dom_newattr("rd", "1")
+        if not self._adopted: # Prerendered nodes are already marked
+            self._dom_newattr("rd", "1")
         self.is_mounted = True
         self.on_mount()
 
     def _dom_newattr(self, name, value):
+        if dom_stats.enabled:
+            dom_stats.count('setAttribute', self)
         self.elem.setAttribute(name, value)
 
     def on_mount(self):
@@ -428,54 +826,203 @@ class BaseComponent(ObjectWithProperties):
         comp.parent = self
         # Sometimes comps are not mounted, we should mount them before render
         if not comp.is_mounted:
-            comp.root = self.root if isinstance(comp, HTMLComp) else comp #Custom comps are their own root
+            comp.root = self.root if isinstance(comp, (HTMLComp, HTMLNode)) else comp #Custom comps are their own root
             comp.mount()
 
-        comp.render(before, after)
+        if comp._adopted:
+            # Hydrated: its DOM node is already in place
+            comp._adopted = False
+        else:
+            comp.render(before, after)
 
     def add_html(self, html):
-        """Simplifies adding HTML elements to a component"""
-        tp = TemplateProcessor()
-        instructions = tp.parse("<HTMLComp>%s</HTMLComp>" % (html))
+        """
+        Simplifies adding HTML elements to a component. html is a string
+        (parsed instructions are cached by html_cache) or an HTMLFragment.
+        """
+        if isinstance(html, HTMLFragment):
+            instructions = html.instructions
+        else:
+            instructions = html_cache.get(html)
         old_instructions = self.instructions
         self.instructions = instructions
         # Parse new instructions, this renders and appends new components to
         # self
-        self.parse_instructions(self, instructions)
-        self.instructions = old_instructions
+        try:
+            self.parse_instructions()
+        finally:
+            self.instructions = old_instructions
 
 
     def remove(self, component):
-        # unmount DOM first
-        component.unmount()
+        pool = _pool_with_room(component)
+        # Detach it, if pooled keeping its DOM and bindings to reuse it (see acquire)
+        if dom_stats.enabled:
+            dom_stats.count('removeChild', component)
+        self.elem.removeChild(component.elem)
 
         # Remove component
         self.children.remove(component)
-        # Remove cid association
-        comp_k = None
-        for k in self.ids:
-            if self.ids[k] == component:
-                comp_k = k
-                break
-        if comp_k is not None:
-            del self.ids[comp_k]
+        self._del_cid(component)
+        if pool is None:
+            teardown((component,), True)
+        else:
+            component._recycle(pool)
 
-        RefMap.remove(component) #TODO removing comp from refmap will cause error in its binded events
+    def replace(self, child, comp):
+        """Puts comp (mounted if needed) in the place of child, which is removed"""
+        comp.parent = self
+        if not comp.is_mounted:
+            comp.root = self.root if isinstance(comp, (HTMLComp, HTMLNode)) else comp
+            comp.mount()
+        if dom_stats.enabled:
+            dom_stats.count('replaceChild', comp)
+        self.elem.replaceChild(comp.elem, child.elem)
+        self.children.replace(child, comp)
+        cid = child.cid
+        self._del_cid(child)
+        if cid is not None:
+            owner = self if self.root is None else self.root
+            owner._add_cid(comp, cid)
+        teardown((child,), True)
+
+    def _del_cid(self, component):
+        # cids are kept by the root (see parse_instructions)
+        if component.cid is not None:
+            owner = self if self.root is None else self.root
+            ids = getattr(owner, 'ids', None)
+            if ids is not None and ids.get(component.cid) is component:
+                del ids[component.cid]
+            component.cid = None
+
+    def every(self, ms, callback):
+        """Calls callback() every ms with the shared clock until the component is unmounted"""
+        key = clock.subscribe(ms, callback)
+        if self._ticks is None:
+            self._ticks = []
+        self._ticks.append((ms, key))
+        return key
+
+    def _stop_ticks(self):
+        if self._ticks is not None:
+            for ms, key in self._ticks:
+                clock.unsubscribe(ms, key)
+            self._ticks = None
+
+    def _recycle(self, pool):
+        # Bindings set by the template it came from would keep driving it from the pool
+        self._release_bindings(())
+        self._stop_ticks()
+        self.parent = None
+        self.on_unmount()
+        self.on_recycle()
+        pool.append(self)
 
-    def remove_all(self):
-        torem = [c for c in self.children]
-        for c in torem:
-            self.remove(c)
-        self.ids = {}
+    def query(self, cid=None, tag=None):
+        """
+        Returns a tuple with the descendants (document order) that have cid
+        and/or tag. Results are cached until children are added or removed
+        anywhere.
+        """
+        key = (cid, None if tag is None else tag.upper())
+        cache = self._query_cache
+        if cache is None or cache[0] != ChildList.version:
+            cache = self._query_cache = (ChildList.version, {})
+        result = cache[1].get(key)
+        if result is None:
+            result = cache[1][key] = self._query(key[0], key[1])
+        return result
+
+    def _query(self, cid, tag):
+        found = []
+        stack = [self]
+        while stack:
+            comp = stack.pop()
+            if comp.children:
+                stack.extend(comp.children[::-1])
+            if comp is self:
+                continue
+            if (cid is None or comp.cid == cid) and (tag is None or ("%s" % (comp.tag,)).upper() == tag):
+                found.append(comp)
+        return tuple(found)
+
+    @classmethod
+    def acquire(cls):
+        """
+        Returns an instance from the pool of the class or a new one. Instances
+        go to the pool when removed, up to pool_size (0: no pool) per class.
+        Pooled instances keep their DOM and the bindings of their template: add()
+        just inserts them again. Bindings set by the template they came from are released.
+        """
+        return cls._from_pool(cls.tag) or cls()
+
+    @classmethod
+    def _from_pool(cls, tag):
+        pool = POOLS.get((cls, tag))
+        if pool:
+            return pool.pop()
+        return None
+
+    def on_recycle(self):
+        """Reset hook, called when the component goes to the pool"""
+        pass
+
+    def remove_all(self, keep=None):
+        """
+        Removes every child but keep. The content is detached with a single
+        DOM write; releasing the subtrees costs the same as removing them one
+        by one (see teardown).
+        """
+        children = [c for c in self.children if c is not keep]
+        if dom_stats.enabled:
+            dom_stats.count('innerHTML', self)
+        self.elem.html = ''
+        if keep is not None:
+            self.elem <= keep.elem
+        self.children = ChildList(() if keep is None else (keep,))
+        _drop_statics(self)
+        released = []
+        for c in children:
+            self._del_cid(c)
+            pool = _pool_with_room(c)
+            if pool is None:
+                released.append(c)
+            else:
+                c._recycle(pool)
+        teardown(released, True)
 
     def unmount(self):
+        # One DOM operation detaches the whole subtree
+        if dom_stats.enabled:
+            dom_stats.count('removeChild', self)
         self.parent.elem.removeChild(self.elem)
-        RefMap.remove(self.elem)
-        del self.elem
-        self.elem = None
-        # TODO Unmount binds to DOM and from DOM
-        self.is_mounted = False
-        self.on_unmount()
+        teardown((self,))
+
+    def _release_bindings(self, doomed):
+        """Unbinds the observers registered by update_with_expression (but from doomed sources)"""
+        if self._bindings is not None:
+            for source, propname, observer in self._bindings:
+                if id(source) not in doomed:
+                    source.unbind(propname, observer)
+            self._bindings = None
+
+    def _release(self, descendant, doomed, released):
+        """Releases what teardown needs (see teardown). Descendants add their iid to released[class]"""
+        self._release_bindings(doomed)
+        if self._events is not None:
+            for eventname, callback in self._events:
+                self.elem.unbind(eventname, callback)
+            self._events = None
+        self._stop_ticks()
+        refs = RefMap.ref
+        refs.pop(id(self.elem), None)
+        if descendant:
+            _release_cid(self, doomed)
+            iids = released.get(self.__class__)
+            if iids is None:
+                iids = released[self.__class__] = []
+            iids.append(self.iid)
+            refs.pop(id(self), None)
 
 
 class Component(BaseComponent):
@@ -495,6 +1042,12 @@ class Component(BaseComponent):
     _style_comp = None
 
     cls_initialized = False
+    # Insert static parts of the template as blocks, without components (see TemplateProcessor)
+    hoist_static = True
+    # Mount root instances in time slices (see mount_incremental)
+    incremental_mount = False
+    # False if the content is built in callbacks instead of the template (see server.stream_render)
+    streamable = True
 
     def __init__(self, domnode=None):
         super(Component, self).__init__(domnode)
@@ -517,26 +1070,47 @@ class Component(BaseComponent):
         """
         Process the Component (and its children): Parses instructions, binds properties and renders the DOMNode in the site.
         """
+        self._mount_begin()
+        self.parse_instructions()
+        self._mount_end()
+        return self
+
+    def mount_incremental(self, budget=8, on_done=None):
+        """
+        Mounts the Component in chunks of at most budget ms per animation frame
+        so large trees don't block input. Subtrees are revealed as they are
+        completed and on_mount callbacks keep the same (children first) order
+        as mount(). on_done(comp) is called when the whole tree is mounted.
+        Returns the IncrementalMount.
+        """
+        mounter = IncrementalMount(self, budget, on_done)
+        mounter.start()
+        return mounter
+
+    def _mount_begin(self):
         if self.elem is None: # Create DOM elem if needed
-            tag = self.tag if self.rendertag is None else self.rendertag
-            self.elem = self._create_domelem(tag)
+            self.elem = self._new_domelem()
         self._dom_newattr("id", "%s_%s" % (self.__class__.__name__, self.iid))
 
         self.set_context(self.root)
+        self._start_adopt()
 
         # Create style comp and add it
         if len(self.style):
             self._mount_style()
 
-        pprint("Mounting", self, "Instructions",
-               self.instructions, "Context: ", self.context)
-        self.parse_instructions()
+        if log.enabled:
+            log.debug("Mounting", self, "Instructions",
+                      self.instructions, "Context: ", self.context)
 
+    def _mount_end(self):
+        self._end_adopt()
         # If this is root comp (no parent) then set props from DOM attributes
         # Grab props from root domnode and use them to initialize component's
         # props
         if self.parent is None:
-            pprint("Parsing properties values from DOM to Component")
+            if log.enabled:
+                log.debug("Parsing properties values from DOM to Component")
             for attr in self.elem.attributes:
                 try:
                     name, value = attr.name, attr.value
@@ -550,13 +1124,14 @@ class Component(BaseComponent):
                     pass
         # mark as mounted
         self._mark_as_mounted()
-        return self
 
     def _mount_style(self):
         self._rendered_style = self.style.replace(
             ":host", "#%s" % (self.elem.id))
         if self._style_comp is None:
-            self._style_comp = HTMLComp(tag='style')
+            domnode = self._claim_domelem('style') if self._adopt_nodes is not None else None
+            self._style_comp = HTMLComp(tag='style', domnode=domnode)
+            self._style_comp._adopted = domnode is not None
             self.add(self._style_comp)
         self._style_comp.html = self._rendered_style
 
@@ -565,19 +1140,30 @@ class Component(BaseComponent):
         if self.is_mounted:
             self._mount_style()
 
+    def on_recycle(self):
+        """Resets props to their default values when the component goes to the pool"""
+        for propname in self._prop_list:
+            if propname not in ('is_mounted', 'style', '_rendered_style'):
+                prop = getattr(self.__class__, propname)
+                default = prop.defaultvalue
+                if isinstance(default, list):
+                    default = list(default)
+                elif isinstance(default, dict):
+                    default = dict(default)
+                setattr(self, propname, default)
+
 
     def _add_cid(self, comp, cid):
         if cid is not None:
             self.ids[cid] = comp
+            comp.cid = cid
 
     def get(self, cid):
         """Gets component by its cid"""
         return self.ids[cid]
 
     def remove_all(self):
-        torem = [c for c in self.children if c is not self._style_comp]
-        for c in torem:
-            self.remove(c)
+        BaseComponent.remove_all(self, keep=self._style_comp)
         self.ids = {}
 
 
@@ -595,24 +1181,584 @@ class HTMLComp(BaseComponent):
         self.bind("html", callback)
 
     def on_html(self, value, instance):
+        if dom_stats.enabled:
+            dom_stats.count('innerHTML', self)
         self.elem.innerHTML = value
 
+    @classmethod
+    def acquire(cls, tag):
+        """Pooled HTMLComp for tag (see BaseComponent.acquire)"""
+        return cls._from_pool(tag) or cls(tag)
+
     def mount(self):
-        self.set_context(self.root)
+        self._mount_begin()
         self.parse_instructions()
+        self._mount_end()
+        return self
+
+    def _mount_begin(self):
+        self.set_context(self.root)
+        self._start_adopt()
+
+    def _mount_end(self):
+        self._end_adopt()
         # mark as mounted
         self._mark_as_mounted()
-        return self
 
     # Events Logic
     def domevent_callback(self, expression, context):
         """Returns a callback that evals expression using context as globals"""
-        return partial(self._domevent_callback, expression=expression, context=context)
+        return DOMEventBinding(self, expression, context)
 
     def _domevent_callback(self, event, expression, context):
-        pprint("EVENT", event, "expression", expression)
+        if log.enabled:
+            log.debug("EVENT", event, "expression", expression)
         real_context = {'self': RefMap.get(context['self']),'parent': RefMap.get(context['parent']),'root':RefMap.get(context['root']),'this': RefMap.get(context['this'])}
-        eval(expression, real_context)  # TODO security?
+        # User input: propagate changes before background work
+        scheduler.run_with_priority(USER_BLOCKING, eval, expression, real_context)  # TODO security?
+
+class HTMLNode(object):
+    """
+    Flyweight for classic HTML nodes that don't need a component: texts,
+    dynodes (DynNode) and elements without cid or events. Slotted, without
+    Property storage or RefMap entries: dynamic attributes are updated by
+    NodeBindings. context is built (and registered in RefMap) on demand.
+    """
+    __slots__ = ('tag', 'elem', 'parent', 'root', 'children', 'instructions', 'is_mounted',
+                 '_adopt_nodes', '_hydrating', '_adopted', '_statics', '_context', '_bindings')
+    dom_renderer = BaseComponent.dom_renderer
+    pool_size = 0
+    cid = None  # Nodes with cid are HTMLComps
+
+    def __init__(self, tag, domnode):
+        self.tag = tag
+        self.elem = domnode
+        self.parent = None
+        self.root = None
+        self.children = ()  # A ChildList once children are added, most nodes are leaves
+        self.instructions = ()
+        self.is_mounted = False
+        self._adopt_nodes = None
+        self._hydrating = False
+        self._adopted = False
+        self._statics = None
+        self._context = None
+        self._bindings = None  # Last NodeBinding, linked with NodeBinding.next
+
+    def __repr__(self):
+        return "%s tag: %s id: %s" % (self.__class__.__name__, self.tag, id(self))
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = {"self": RefMap.add(self), "this": RefMap.add(self.elem),
+                             "root": RefMap.add(self.root), "parent": RefMap.add(self.parent)}
+        return self._context
+
+    def bind_expression(self, name, expression, props2bind):
+        """Sets elem attribute name (innerHTML for 'html') to expression, now and when props2bind change"""
+        binding = NodeBinding(self, name, expression, props2bind)
+        for objname, propname in props2bind:
+            try:
+                self._source(objname).bind(propname, binding)
+            except Exception as e:
+                print("error binding", e)
+        binding.next = self._bindings
+        self._bindings = binding
+        binding()
+
+    def _source(self, objname):
+        if objname == 'root':
+            return self.root
+        if objname == 'parent':
+            return self.parent
+        return self
+
+    def _release(self, descendant, doomed, released):
+        binding = self._bindings
+        while binding is not None:
+            for objname, propname in binding.props2bind:
+                source = self._source(objname)
+                if id(source) not in doomed and source is not self:
+                    source.unbind(propname, binding)
+            binding = binding.next
+        self._bindings = None
+        # Also referenced by the contexts of its children
+        refs = RefMap.ref
+        refs.pop(id(self), None)
+        if self._context is not None:
+            refs.pop(id(self.elem), None)
+            self._context = None
+
+    def mount(self):
+        self._mount_begin()
+        self.parse_instructions()
+        self._mount_end()
+        return self
+
+    def _mount_begin(self):
+        self._start_adopt()
+
+    def _mount_end(self):
+        self._end_adopt()
+        if not self._adopted:
+            self.elem.setAttribute("rd", "1")
+        self.is_mounted = True
+
+    def on_mount(self):
+        pass
+
+    def on_unmount(self):
+        pass
+
+    def add(self, comp, before=None, after=None):
+        if not self.children:
+            self.children = ChildList()
+        BaseComponent.add(self, comp, before, after)
+
+    # Building children works as in components
+    parse_instructions = BaseComponent.parse_instructions
+    _create_from_instruction = BaseComponent._create_from_instruction
+    _create_node = BaseComponent._create_node
+    create_component = BaseComponent.create_component
+    _create_domelem = BaseComponent._create_domelem
+    _start_adopt = BaseComponent._start_adopt
+    _claim_domelem = BaseComponent._claim_domelem
+    _claim_static = BaseComponent._claim_static
+    _end_adopt = BaseComponent._end_adopt
+    _add_static = BaseComponent._add_static
+    remove = BaseComponent.remove
+    remove_all = BaseComponent.remove_all
+    replace = BaseComponent.replace
+    _del_cid = BaseComponent._del_cid
+    render = BaseComponent.render
+    unmount = BaseComponent.unmount
+
+
+class NodeBinding(object):
+    """Observer that sets the attribute name of node.elem (innerHTML for 'html') to the evaluated expression"""
+    __slots__ = ('node', 'name', 'expression', 'props2bind', 'value', 'next')
+
+    def __init__(self, node, name, expression, props2bind):
+        self.node = node
+        self.name = name
+        self.expression = expression
+        self.props2bind = props2bind
+        self.value = _NOTSET
+        self.next = None
+
+    def __call__(self, value=None, instance=None):
+        node = self.node
+        elem = node.elem
+        if elem is None:  # Unmounted
+            return
+        v = self.expression(node.root, node.parent, node, elem)
+        # Only changes touch the DOM (as with Property values)
+        if v != self.value:
+            self.value = v
+            if dom_stats.enabled:
+                dom_stats.count('innerHTML' if self.name == 'html' else 'setAttribute', node)
+            if self.name == 'html':
+                elem.innerHTML = v
+            else:
+                setattr(elem, self.name, v)
+
+    def __repr__(self):
+        return "<NodeBinding %s.%s>" % (self.node.tag, self.name)
+
+
+class DynNode(HTMLNode):
+    """
+    HTMLNode of a dynode, also the NodeBinding of its content: a dynode is one
+    object (no NodeBinding is allocated for it).
+    """
+    __slots__ = ('expression', 'props2bind', 'value')
+    name = 'html'
+    next = None  # Last in the chain of _bindings
+
+    def __init__(self, tag, domnode):
+        HTMLNode.__init__(self, tag, domnode)
+        self.expression = None
+        self.props2bind = ()
+        self.value = _NOTSET
+
+    @property
+    def node(self):
+        return self
+
+    def bind_expression(self, name, expression, props2bind):
+        if name != 'html' or self.expression is not None:
+            return HTMLNode.bind_expression(self, name, expression, props2bind)
+        self.expression = expression
+        self.props2bind = props2bind
+        for objname, propname in props2bind:
+            try:
+                self._source(objname).bind(propname, self)
+            except Exception as e:
+                print("error binding", e)
+        self._bindings = self
+        self()
+
+    __call__ = NodeBinding.__call__
+
+
+_NOTSET = object()
+
+
+def _has_events(attributes):
+    for attr in attributes:
+        if attr[2] == EVENT_ATTR or attr[0] in DOMEVENTS:
+            return True
+    return False
+
+
+class ChildList(object):
+    """
+    Children of a component: ordered, with O(1) append, remove and
+    membership test. Indexing uses a list cached until the next change and
+    iteration works on a snapshot (children can be removed meanwhile).
+    """
+    __slots__ = ('_items', '_list')
+    version = 0  # Changes with any ChildList (see BaseComponent.query)
+
+    def __init__(self, items=()):
+        self._items = {}  # {id(comp): comp}, insertion ordered
+        self._list = None
+        for item in items:
+            self.append(item)
+
+    def append(self, comp):
+        self._items[id(comp)] = comp
+        self._list = None
+        ChildList.version += 1
+
+    def remove(self, comp):
+        try:
+            del self._items[id(comp)]
+        except KeyError:
+            raise ValueError("%r is not a child" % (comp,))
+        self._list = None
+        ChildList.version += 1
+
+    def clear(self):
+        self._items = {}
+        self._list = None
+        ChildList.version += 1
+
+    def replace(self, comp, new):
+        """Puts new in the place of comp"""
+        if id(comp) not in self._items:
+            raise ValueError("%r is not a child" % (comp,))
+        items = {}
+        for key, c in self._items.items():
+            if c is comp:
+                items[id(new)] = new
+            else:
+                items[key] = c
+        self._items = items
+        self._list = None
+        ChildList.version += 1
+
+    def sort(self, key):
+        """Reorders children (e.g. after inserting several with add(before=...))"""
+        items = sorted(self._items.values(), key=key)
+        self._items = dict((id(comp), comp) for comp in items)
+        self._list = items
+        ChildList.version += 1
+
+    def _get_list(self):
+        if self._list is None:
+            self._list = list(self._items.values())
+        return self._list
+
+    def index(self, comp):
+        return self._get_list().index(comp)
+
+    def __getitem__(self, index):
+        return self._get_list()[index]
+
+    def __iter__(self):
+        return iter(self._get_list())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, comp):
+        return id(comp) in self._items
+
+    def __repr__(self):
+        return "ChildList(%r)" % (self._get_list(),)
+
+
+def teardown(comps, discard=False):
+    """
+    Releases the subtrees of comps, already detached from the DOM, in one
+    walk: bindings to properties of objects that live on, DOM event
+    handlers, cids and RefMap entries. Descendants also lose their property
+    values and observers (a component mounted again creates new ones),
+    dropped a class at a time after the walk. on_unmount is called children first. comps stay usable (unmounted)
+    unless discard, then they are released like their descendants.
+    """
+    order = []
+    stack = list(comps)
+    while stack:
+        comp = stack.pop()
+        order.append(comp)
+        children = comp.children
+        if children.__class__ is ChildList:
+            stack.extend(children._items.values())  # Without building the indexable list
+        elif children:
+            stack.extend(children)
+    # Objects released here, their observers don't need to be unbound
+    doomed = set(id(c) for c in order[0 if discard else len(comps):])
+    top = set(id(c) for c in comps)
+    released = {}  # {class: [iid]} of the components that lose their property values
+    for comp in reversed(order):
+        if id(comp) not in top or discard:
+            comp.on_unmount()
+            comp._release(True, doomed, released)
+            if id(comp) not in top:
+                continue
+        else:
+            comp._release(False, doomed, released)
+        comp.children = () if isinstance(comp, HTMLNode) else ChildList()
+        _drop_statics(comp)
+        comp.elem = None
+        if not discard:
+            comp.is_mounted = False
+            comp.on_unmount()
+    # Property values and observers, a class at a time
+    for cls, iids in released.items():
+        for prop in _class_props(cls):
+            storage, observers = prop.storage, prop.observers
+            for iid in iids:
+                storage.pop(iid, None)
+                observers.pop(iid, None)
+
+
+def _drop_statics(comp):
+    if comp._statics is not None:
+        for block in comp._statics:
+            block.parent = None  # Skips its render if still pending
+        comp._statics = None
+
+
+def _release_cid(comp, doomed):
+    if comp.cid is not None and comp.parent is not None:
+        owner = comp.parent.root
+        if owner is not None and id(owner) not in doomed:
+            ids = getattr(owner, 'ids', None)
+            if ids is not None and ids.get(comp.cid) is comp:
+                del ids[comp.cid]
+
+
+def _pool_with_room(comp):
+    if comp.pool_size:
+        pool = POOLS.setdefault((comp.__class__, comp.tag), [])
+        if len(pool) < comp.pool_size:
+            return pool
+    return None
+
+
+_CLASS_PROPS = {}
+
+
+def _class_props(cls):
+    props = _CLASS_PROPS.get(cls)
+    if props is None:
+        props = [getattr(cls, name) for name in dir(cls) if isinstance(getattr(cls, name), Property)]
+        _CLASS_PROPS[cls] = props
+    return props
+
+
+class StaticBlock(object):
+    """
+    Nodes inserted from a STATIC instruction. Not a component: it only
+    quacks like one for the DOM renderer (parent and elem, a DocumentFragment
+    until it's rendered).
+    """
+    __slots__ = ('parent', 'elem', 'nodes')
+
+    def __init__(self, parent, nodes=None):
+        self.parent = parent
+        self.elem = None
+        self.nodes = nodes
+
+
+def _node_matches(node, tag, text=None):
+    if tag == 'text':
+        # Static text must match too: a stale prerendered page isn't adopted
+        return node.nodeType == TEXT and (text is None or node.text == text)
+    return node.nodeType == ELEMENT and node.nodeName == tag.upper()
+
+
+class IncrementalMount(object):
+    """
+    Time sliced mount of a component tree. Instructions are processed
+    depth first from an explicit stack; each step() works until the time budget
+    (ms) is spent and start() schedules steps in animation frames until done.
+    Children of classic HTML nodes are added to their parent when their whole
+    subtree is ready, so on_mount fires children first (as in mount()).
+    Custom components found in the tree are mounted synchronously, as a unit.
+    """
+
+    def __init__(self, comp, budget=8, on_done=None):
+        self.comp = comp
+        self.budget = budget
+        self.on_done = on_done
+        self.done = False
+        self.frames = 0
+        self.stack = []
+
+    def start(self):
+        self._push(self.comp, None, None)
+        window.requestAnimationFrame(self._frame)
+
+    def _frame(self, ev=None):
+        self.frames += 1
+        if not self.step():
+            window.requestAnimationFrame(self._frame)
+
+    def _push(self, comp, parent, cid):
+        comp._mount_begin()
+        self.stack.append([comp, 0, parent, cid, comp.root])
+
+    def run(self):
+        """Mounts the remaining tree synchronously"""
+        while not self.step(budget=None):
+            pass
+
+    def step(self, budget=-1):
+        """Processes instructions for budget ms (self.budget by default, None
+        for no limit). Always makes progress. Returns True when done."""
+        if not self.stack and not self.done:
+            self._push(self.comp, None, None)
+        if budget == -1:
+            budget = self.budget
+        deadline = None if budget is None else now_ms() + budget
+        stack = self.stack
+        while stack:
+            frame = stack[-1]
+            comp, index, parent, cid, context_root = frame
+            instructions = comp.instructions
+            if index < len(instructions):
+                frame[1] = index + 1
+                child, child_cid = comp._create_from_instruction(instructions[index])
+                if child is not None:
+                    if child.is_mounted:
+                        context_root._add_cid(child, child_cid)
+                        comp.add(child)
+                    else:
+                        self._push(child, comp, child_cid)
+            else:
+                stack.pop()
+                comp._mount_end()
+                if parent is not None:
+                    parent.root._add_cid(comp, cid)
+                    parent.add(comp)
+            if deadline is not None and now_ms() >= deadline:
+                break
+        if not stack and not self.done:
+            self.done = True
+            if self.on_done is not None:
+                self.on_done(self.comp)
+        return self.done
+
+
+# Callback objects. Slotted callables used in hot paths (property chains, DOM
+# events, render jobs and clock ticks) instead of partial(): calling them
+# doesn't allocate keyword dicts.
+class ChainPropBinding(object):
+    """
+    Observer that updates objref.propname with the evaluated expression.
+    The owner is held weakly: the binding doesn't keep it alive and is
+    dropped by notify_observers once the owner is gone.
+    """
+    __slots__ = ('_owner', 'propname', 'expression', 'context', 'objref')
+
+    def __init__(self, owner, propname, expression, context, objref):
+        self._owner = ref(owner)
+        self.propname = propname
+        self.expression = expression
+        self.context = context
+        self.objref = objref
+
+    @property
+    def owner(self):
+        return self._owner()
+
+    def __call__(self, value, instance):
+        owner = self._owner()
+        if owner is not None:
+            owner._chain_prop(value, instance, self.propname, self.expression, self.context, self.objref)
+
+    @property
+    def target(self):
+        return self.owner._chain_prop
+
+    def __repr__(self):
+        return "<ChainPropBinding %s.%s>" % (self.owner.__class__.__name__, self.propname)
+
+
+class DOMEventBinding(object):
+    """DOM event callback that evals expression using context as globals"""
+    __slots__ = ('comp', 'expression', 'context')
+
+    def __init__(self, comp, expression, context):
+        self.comp = comp
+        self.expression = expression
+        self.context = context
+
+    def __call__(self, event):
+        self.comp._domevent_callback(event, self.expression, self.context)
+
+    @property
+    def target(self):
+        return self.comp._domevent_callback
+
+    def __repr__(self):
+        return "<DOMEventBinding %s %r>" % (self.comp.__class__.__name__, self.expression)
+
+
+class RenderJob(object):
+    """Render callback scheduled with requestAnimationFrame"""
+    __slots__ = ('renderer', 'comp', 'before', 'after')
+
+    def __init__(self, renderer, comp, before=None, after=None):
+        self.renderer = renderer
+        self.comp = comp
+        self.before = before
+        self.after = after
+
+    def __call__(self, ev=None):
+        self.renderer._render(ev, self.comp, self.before, self.after)
+
+    @property
+    def target(self):
+        return self.renderer._render
+
+    def __repr__(self):
+        return "<RenderJob %r>" % (self.comp,)
+
+
+class ClockTick(object):
+    """Interval callback of a Clock period, run in the lane of the clock"""
+    __slots__ = ('clock', 'ms')
+
+    def __init__(self, clock, ms):
+        self.clock = clock
+        self.ms = ms
+
+    def __call__(self, *args):
+        scheduler.run_with_priority(self.clock.priority, self.clock._tick, self.ms)
+
+    @property
+    def target(self):
+        return self.clock._tick
+
+    def __repr__(self):
+        return "<ClockTick %s ms>" % (self.ms,)
+
 
 # From functools
 def partial(func, *args, **keywords):
@@ -642,11 +1788,103 @@ def callback(value, instance):
 
 
 CONSOLE_ENABLED = False
+# Debug checks (e.g. RefMap collisions). Removed in production builds (build.py strip)
+DEBUG = True
+
+
+class Log(object):
+    """
+    Lazy logging facade. Hot paths guard their calls with `if log.enabled:` so
+    nothing (argument tuples, formatted strings, reprs) is built while logging
+    is disabled. Guarded blocks are removed in production builds.
+    """
+    enabled = CONSOLE_ENABLED
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def debug(self, *args):
+        if self.enabled:
+            print(args)
+
+log = Log()
+
+
+class DOMStats(object):
+    """
+    DOM operation counters. While enabled, the DOM calls made by components
+    are counted by operation, component class and the property change that
+    triggered them ('Class.prop' of the outermost change, None for calls
+    outside observers, e.g. render jobs run in a later frame). Hot paths
+    guard the calls with `if dom_stats.enabled:`.
+
+        with dom_stats as stats:
+            flist.filtervalue = 'a'
+        stats.total()
+        stats.total('createElement', prop='FilteredList.filtervalue')
+    """
+    enabled = False
+
+    def __init__(self):
+        self.counts = {}  # {(operation, class name, trigger): n}
+        self.trigger = None
+        self._names = {}  # {class: {id(prop): 'Class.prop'}}
+
+    def reset(self):
+        self.counts = {}
+
+    def count(self, operation, comp):
+        key = (operation, comp.__class__.__name__, self.trigger)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def notify(self, prop, iid, instance, value):
+        """Notifies the observers of prop with prop as trigger"""
+        self.trigger = self._prop_name(prop, instance)
+        try:
+            prop.notify_observers(iid, instance, value)
+        finally:
+            self.trigger = None
+
+    def _prop_name(self, prop, instance):
+        cls = instance.__class__
+        names = self._names.get(cls)
+        if names is None:
+            names = self._names[cls] = {}
+            for name in dir(cls):
+                attr = getattr(cls, name)
+                if isinstance(attr, Property):
+                    names[id(attr)] = "%s.%s" % (cls.__name__, name)
+        return names.get(id(prop))
+
+    def total(self, operation=None, cls=None, prop=None):
+        """Number of operations, filtered by operation, class name and trigger"""
+        return sum(n for (op, cls_name, trigger), n in self.counts.items()
+                   if (operation is None or op == operation) and (cls is None or cls_name == cls)
+                   and (prop is None or trigger == prop))
+
+    def by(self, field):
+        """{operation, class name or trigger: n}, field is 'operation', 'class' or 'prop'"""
+        index = ('operation', 'class', 'prop').index(field)
+        result = {}
+        for key, n in self.counts.items():
+            result[key[index]] = result.get(key[index], 0) + n
+        return result
+
+    def __enter__(self):
+        self.reset()
+        self.enabled = True
+        return self
+
+    def __exit__(self, *exc):
+        self.enabled = False
+        self.trigger = None
+
+dom_stats = DOMStats()
 
 
 def pprint(*args, **kwargs):
     force = kwargs['force'] if 'force' in kwargs else False
-    if CONSOLE_ENABLED or force:
+    if CONSOLE_ENABLED or log.enabled or force:
         print(args)
 
 DP = None
@@ -672,22 +1910,34 @@ try:
     def match_search(text, regex):
         jstext = window.String.new(text)
         return jstext.search(regex)
+
+    def now_ms():
+        return window.performance.now()
 except:
-    pprint("No brython and javascript libs.", force=True)
+    pprint("No brython and javascript libs, headless DOM.")
 
     import re
+    import time
+    if 'window' not in globals():
+        # Plain CPython: in memory DOM
+        from .headless import document, window
+    DP = window.DOMParser.new()
 
-    REGEX_SELF = re.compile("self\.[A-z0-9_]{1,}")
+    REGEX_SELF = re.compile("(?:self|parent|root)\.[A-Za-z0-9_]{1,}")
     REGEX_BRACKETS = re.compile("\{(.*?)\}")
 
     def match(text, regex):
         return re.findall(regex, text)
 
     def match_replace(text, regex, replace):
-        raise Exception
+        return re.sub(regex, replace, text)
 
     def match_search(text, regex):
-        raise Exception
+        m = re.search(regex, text)
+        return -1 if m is None else m.start()
+
+    def now_ms():
+        return time.perf_counter() * 1000
 
 
 class Register(object):
@@ -716,6 +1966,40 @@ class Register(object):
     @classmethod
     def remove(cls, comp_cls):
         cls.reg.remove(comp_cls)
+        cls._reg_names.remove(comp_cls.__name__.upper())
+
+# Templates pre-parsed by build.py bundle: {template string: instructions}
+PRECOMPILED_TEMPLATES = {}
+
+
+# Removed components for reuse (BaseComponent.acquire): {(class, tag): [components]}
+POOLS = {}
+
+
+def _build_nodes(parent, instructions):
+    """Appends to parent the DOM of static instructions (texts and plain HTML elements)"""
+    for instruction in instructions:
+        if instruction[0] == TEXT:
+            parent.appendChild(document.createTextNode(instruction[1]))
+            continue
+        node = document.createElement(instruction[1])
+        for attr in instruction[2]:
+            node.setAttribute(attr[0], attr[1])
+        node.setAttribute('rd', '1')
+        _build_nodes(node, instruction[3])
+        parent.appendChild(node)
+
+
+def load_precompiled_templates():
+    """Loads pre-parsed templates when the page includes a bundle made by build.py bundle"""
+    try:
+        if not window.__BRYTHON__.components_bundle:
+            return
+    except:
+        return
+    from ._precompiled import TEMPLATES
+    PRECOMPILED_TEMPLATES.update(TEMPLATES)
+
 
 def initialize_comps_classes():
     tp = TemplateProcessor()
@@ -724,8 +2008,12 @@ def initialize_comps_classes():
         if comp_cls.cls_initialized:
             continue
         pprint("Initializing ", comp_cls)
-        # Parsing template
-        comp_cls.instructions = tp.parse(comp_cls.template)
+        # Parsing template (skip DOMParser if it was pre-parsed in the bundle, with hoist_static)
+        tp.hoist_static = comp_cls.hoist_static
+        if comp_cls.hoist_static and comp_cls.template in PRECOMPILED_TEMPLATES:
+            comp_cls.instructions = PRECOMPILED_TEMPLATES[comp_cls.template]
+        else:
+            comp_cls.instructions = tp.parse(comp_cls.template)
         # End parsing
         if comp_cls.tag is None:
             comp_cls.tag = comp_cls.__name__
@@ -740,24 +2028,55 @@ def initialize_comps_classes():
         comp_cls.cls_initialized = True
 
 
-def render(event):
+def render(event=None):
+    """Mounts registered components found in the document. Prerendered ones
+    (server.render_to_string) are hydrated."""
+    global _first_render
+    first_render, _first_render = _first_render, False
 
     for comp_cls in Register.reg:
         pprint("Initializing elements", comp_cls)
         elems = document.get(selector=comp_cls.tag)
+        if first_render and comp_cls.rendertag is not None:
+            # Prerendered with rendertag, found by id
+            prefix = "%s_" % (comp_cls.__name__,)
+            elems = list(elems) + [e for e in document.get(selector='%s[rd]' % (comp_cls.rendertag,))
+                                   if (e.getAttribute('id') or '').startswith(prefix)]
         pprint("Elements found:", len(elems))
         for elem in elems:
+            hydrate = False
             try:
-                # If has rd then the component is already initialized
+                # If has rd then the component is already initialized (or
+                # prerendered, in the first render)
                 if elem.rd:
-                    continue
+                    if not first_render or _inside_component(elem):
+                        continue
+                    hydrate = True
             except:
                 pass
             rootcomp = comp_cls(elem)
             rootcomp.root =  rootcomp
-            rootcomp.mount()
+            if hydrate:
+                rootcomp.hydrate()
+            elif rootcomp.incremental_mount:
+                rootcomp.mount_incremental()
+            else:
+                rootcomp.mount()
             # TODO What happens with root components? Are they garbage collected? Should we store a reference in a global variable?
 
+_first_render = True
+
+
+def _inside_component(elem):
+    """True if an ancestor of elem was rendered by a component (nested prerendered comps
+    are hydrated by their root)"""
+    node = elem.parentNode
+    while node is not None and node.nodeType == ELEMENT:
+        if node.getAttribute('rd'):
+            return True
+        node = node.parentNode
+    return False
+
 
 def init():
     initialize_comps_classes()
@@ -766,24 +2085,65 @@ def init():
 
 class TemplateProcessor(object):
 
-    """Parses Component's template into an instructions set """
+    """
+    Parses Component's template into an instructions set.
+    With hoist_static, runs of sibling nodes without expressions, cids,
+    events or components become a single STATIC instruction.
+    """
     dp = DP
 
+    def __init__(self, hoist_static=False):
+        self.hoist_static = hoist_static
+
     def parse(self, template):
         self.instructions = []
         data = template.replace('{', '|{').replace('}', '}|')
         dom = self.dp.parseFromString(data, "text/xml")
         rootnode = dom.childNodes[0]
         self.instructions = self.parse_children(rootnode)
+        if self.hoist_static:
+            self.instructions = self.hoist(self.instructions)
         return self.instructions
 
+    def hoist(self, instructions):
+        """Groups static sibling instructions in STATIC blocks"""
+        hoisted = []
+        block = None
+        for instruction in instructions:
+            if self._is_static(instruction):
+                if block is None:
+                    block = [STATIC, [], None]
+                    hoisted.append(block)
+                block[1].append(instruction)
+                continue
+            block = None
+            if instruction[0] == ELEMENT and instruction[1] in HTML_TAGS:
+                instruction[3] = self.hoist(instruction[3])
+            hoisted.append(instruction)
+        return hoisted
+
+    def _is_static(self, instruction):
+        if instruction[0] == TEXT:
+            return True
+        if instruction[1] not in HTML_TAGS:  # DYNODE or component
+            return False
+        for attr in instruction[2]:
+            if attr[2] != NORMAL_ATTR or attr[0] == 'cid':
+                return False
+        for child in instruction[3]:
+            if not self._is_static(child):
+                return False
+        return True
+
     def parse_children(self, parentnode, level=0):
-        pprint("Parsing template")
-        pprint("ParentNode", parentnode)
+        if log.enabled:
+            log.debug("Parsing template")
+            log.debug("ParentNode", parentnode)
         instructions = []
         for node in parentnode.childNodes:
             if node.nodeType == TEXT:
-                pprint("%sFound text node:[%s]" % ('--' * level, node.text))
+                if log.enabled:
+                    log.debug("%sFound text node:[%s]" % ('--' * level, node.text))
 
                 texts = node.text.split("|")
                 # Separate normal text nodes from dyncamic ones ({})
@@ -800,8 +2160,9 @@ class TemplateProcessor(object):
                         if len(txt):
                             instructions.append((TEXT, txt))
             else:
-                pprint("%sFound element:" %
-                       ('--' * level), node, "Name:", node.nodeName)
+                if log.enabled:
+                    log.debug("%sFound element:" %
+                              ('--' * level), node, "Name:", node.nodeName)
                 # Attributes
                 attributes = []
 
@@ -825,12 +2186,65 @@ class TemplateProcessor(object):
                 d.append(self.parse_children(node, level + 1))
                 instructions.append(d)  # TODO attributes
 
-        pprint("Parsing template Ended.")
+        if log.enabled:
+            log.debug("Parsing template Ended.")
         return instructions
 
     def _compile_expr(self, expression):
         return compile_expr(expression)
 
+class InstructionCache(object):
+
+    """
+    LRU cache of the instructions of HTML fragments (add_html), keyed by the
+    HTML string. Keeps up to maxsize instruction sets.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = {}  # Insertion ordered: least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, html):
+        entries = self.entries
+        if html in entries:
+            self.hits += 1
+            # Move to the end
+            instructions = entries.pop(html)
+            entries[html] = instructions
+            return instructions
+        self.misses += 1
+        instructions = TemplateProcessor().parse("<HTMLComp>%s</HTMLComp>" % (html))
+        if self.maxsize > 0:
+            entries[html] = instructions
+            while len(entries) > self.maxsize:
+                del entries[next(iter(entries))]
+        return instructions
+
+    def clear(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+
+html_cache = InstructionCache()
+
+
+class HTMLFragment(object):
+
+    """
+    Pre-parsed HTML for add_html. Create it once (e.g. at module level) and
+    add it as many times as needed:
+        ROW = HTMLFragment("<li>{parent.name}</li>")
+        comp.add_html(ROW)
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.instructions = html_cache.get(html)
+
+
 def get_props2bind(expression):
     ret = [x.split('.')[0:2] for x in match(expression, REGEX_SELF)]
     return ret
@@ -842,4 +2256,5 @@ def compile_expr(expression):
     except:
         raise Exception("Cannot compile expression %s"%(expression))
     else:
+        func.expression = expression  # Source, used to serialize instructions (build.py bundle)
         return func
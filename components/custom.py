@@ -1,5 +1,54 @@
 from components import Register, Component, Property, HTMLComp, HTML_TAGS
 
+class SearchIndex(object):
+    """
+    Case insensitive substring search over a list of strings. Keys are
+    lowercased once. Results of the queries typed so far are kept while each
+    contains the previous one: typing one more char narrows the last result
+    and deleting it gets the previous one back. With ngram=n, a n-gram ->
+    positions index gives the candidates of the other queries of n chars or
+    more (e.g. pasted): it doesn't speed up typing and costs memory, see
+    benchmarks.py search.
+    """
+
+    def __init__(self, items, ngram=0):
+        self.items = list(items)
+        self.keys = [x.lower() for x in self.items]
+        self.ngram = ngram
+        self.grams = {}
+        if ngram:
+            for pos, key in enumerate(self.keys):
+                for gram in set(key[i:i + ngram] for i in range(len(key) - ngram + 1)):
+                    self.grams.setdefault(gram, []).append(pos)
+        self.stack = []  # [(query, positions)], each query contains the previous one
+
+    def search(self, query):
+        """Returns the items containing query, in their order"""
+        query = query.lower()
+        if not query:
+            self.stack = []
+            return list(self.items)
+        stack = self.stack
+        while stack and stack[-1][0] not in query:
+            stack.pop()
+        if stack and stack[-1][0] == query:
+            positions = stack[-1][1]
+        else:
+            if stack:
+                candidates = stack[-1][1]
+            elif self.ngram and len(query) >= self.ngram:
+                # The rarest n-gram of query
+                candidates = min((self.grams.get(query[i:i + self.ngram], ())
+                                  for i in range(len(query) - self.ngram + 1)), key=len)
+            else:
+                candidates = range(len(self.items))
+            keys = self.keys
+            positions = [pos for pos in candidates if query in keys[pos]]
+            stack.append((query, positions))
+        items = self.items
+        return [items[pos] for pos in positions]
+
+
 # Filter list using input text
 
 class FilteredList(Component):
@@ -9,63 +58,68 @@ class FilteredList(Component):
     rendertag='ul'
     itemtag='li'
     filtervalue = Property('')
+    streamable = False  # Items are added in on_items
+    ngram = 0  # n-gram size of the SearchIndex, e.g. 3 for very long lists searched by pasting
+    index = None
     order = {}
 
     def on_filtervalue(self, value, instance):
-        lvalue = value.lower()  
-        newitems = [x for x in self.initial_items if lvalue in x.lower() or not len(value)]
-        self.items = newitems
+        if self.index is None:
+            self.index = SearchIndex(self.initial_items, self.ngram)
+        self.items = self.index.search(value)
     
     def on_initial_items(self, value, instance):
         self.order = {k: v for v,k in enumerate(value)}
+        self.index = SearchIndex(value, self.ngram)
         self.items = list(value)
 
     def on_items(self, value, instance):
-        comp2rm, values2add, current_items = [], list(self.items), []
-        for c in self.children:
-            if c.value in self.items:
-              current_items.append(c.value)
-              values2add.remove(c.value)
+        wanted = set(value)
+        current, comp2rm = set(), []
+        children = list(self.children)
+        for c in children:
+            if c.value in wanted:
+                current.add(c.value)
             else:
-              comp2rm.append(c)
+                comp2rm.append(c)
 
         #Remove
-        for c in comp2rm:
-            self.remove(c)
+        if comp2rm and len(comp2rm) == len(children):
+            self.remove_all()
+        else:
+            for c in comp2rm:
+                self.remove(c)
 
-        # Add 
-        ishtml = self.itemtag.upper() in HTML_TAGS
-        cls_comp = HTMLComp if ishtml else Register.get_component_class(self.itemtag)
-
-        for c in list(self.children):
-            added = []
-            for v in values2add:
-                if self.order[v] < self.order[c.value]:
-                    newcomp = cls_comp(tag=self.itemtag) if ishtml else cls_comp()
-                    newcomp.value = v
-                    newcomp.html = v
-                    self.add(newcomp, before=c)
-                    added.append(v)
-                else:
-                    break
+        # Add, values come in order: insert them before the first child that follows
+        values2add = [v for v in value if v not in current]
+        order, pos = self.order, 0
+        for c in self.children:
+            while pos < len(values2add) and order[values2add[pos]] < order[c.value]:
+                self.add(self._new_item(values2add[pos]), before=c)
+                pos += 1
 
-            for a in added: 
-                values2add.remove(a)
+        if pos:
+            # add() appends to children, put the inserted ones in place
+            self.children.sort(key=lambda c: order[c.value])
 
         # Add remaining
-        HTMLComp(tag='li')
-        for v in values2add:
-            try:
-                newcomp = cls_comp(tag=self.itemtag, domnode=None) if ishtml else cls_comp()
-                newcomp.value = v
-                newcomp.html = v
-            except:
-                pass
-            self.add(newcomp)
+        for v in values2add[pos:]:
+            self.add(self._new_item(v))
+
+    def _new_item(self, v):
+        ishtml = self.itemtag.upper() in HTML_TAGS
+        cls_comp = HTMLComp if ishtml else Register.get_component_class(self.itemtag.upper())
+        newcomp = cls_comp.acquire(self.itemtag) if ishtml else cls_comp.acquire()
+        try:
+            newcomp.value = v
+            newcomp.html = v
+        except:
+            pass
+        return newcomp
 
 
 class ListItem(Component):
-    template = "<ListItem>{self.text}</ListItem>"
+    template = "<ListItem>{root.text}</ListItem>"
     rendertag = "li" # Use <li> instead of <ListItem> to render
     text = Property('')
     value = Property('')
@@ -0,0 +1,580 @@
+"""
+Headless (in memory) DOM used when components run under CPython, where there's
+no browser DOM. Implements the subset of Brython's DOMNode API used by
+components: element creation, attributes, tree operations, innerHTML/outerHTML
+serialization, event binding and a virtual clock for requestAnimationFrame
+and timers.
+"""
+from xml.parsers import expat
+from html.parser import HTMLParser
+import time
+
+ELEMENT_NODE, TEXT_NODE, COMMENT_NODE, DOCUMENT_NODE, FRAGMENT_NODE = 1, 3, 8, 9, 11
+
+VOID_ELEMENTS = frozenset(['AREA', 'BASE', 'BR', 'COL', 'EMBED', 'HR', 'IMG', 'INPUT',
+                           'KEYGEN', 'LINK', 'META', 'PARAM', 'SOURCE', 'TRACK', 'WBR'])
+RAW_TEXT_ELEMENTS = frozenset(['SCRIPT', 'STYLE'])
+
+
+def escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def escape_attr(value):
+    return value.replace('&', '&amp;').replace('"', '&quot;')
+
+
+class Attr(object):
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Node(object):
+    nodeType = None
+    nodeName = None
+
+    def __init__(self):
+        object.__setattr__(self, 'childNodes', [])
+        object.__setattr__(self, 'parentNode', None)
+
+    # Tree
+    @property
+    def firstChild(self):
+        return self.childNodes[0] if self.childNodes else None
+
+    @property
+    def lastChild(self):
+        return self.childNodes[-1] if self.childNodes else None
+
+    @property
+    def nextSibling(self):
+        parent = self.parentNode
+        if parent is None:
+            return None
+        siblings = parent.childNodes
+        i = _index(siblings, self) + 1
+        return siblings[i] if i < len(siblings) else None
+
+    def _adopt(self, node):
+        """Detaches node (or the children of a fragment) from its current parent"""
+        if node.nodeType == FRAGMENT_NODE:
+            nodes = list(node.childNodes)
+            del node.childNodes[:]
+        else:
+            if node.parentNode is not None:
+                node.parentNode.removeChild(node)
+            nodes = [node]
+        for n in nodes:
+            object.__setattr__(n, 'parentNode', self)
+        return nodes
+
+    def appendChild(self, node):
+        self.childNodes.extend(self._adopt(node))
+        return node
+
+    def insertBefore(self, node, ref):
+        if ref is None:
+            return self.appendChild(node)
+        nodes = self._adopt(node)
+        i = _index(self.childNodes, ref)
+        self.childNodes[i:i] = nodes
+        return node
+
+    def insertAfter(self, node, ref):
+        return self.insertBefore(node, ref.nextSibling)
+
+    def replaceChild(self, node, old):
+        self.insertBefore(node, old)
+        return self.removeChild(old)
+
+    def removeChild(self, node):
+        del self.childNodes[_index(self.childNodes, node)]
+        object.__setattr__(node, 'parentNode', None)
+        return node
+
+    def __le__(self, other):
+        """Brython's elem <= child"""
+        self.appendChild(other)
+        return self
+
+    def cloneNode(self, deep=False):
+        clone = self._shallow_clone()
+        if deep:
+            for child in self.childNodes:
+                clone.appendChild(child.cloneNode(True))
+        return clone
+
+    # Content
+    def _get_text(self):
+        return ''.join(c.text for c in self.childNodes if c.nodeType != COMMENT_NODE)
+
+    def _set_text(self, value):
+        for child in self.childNodes:
+            object.__setattr__(child, 'parentNode', None)
+        del self.childNodes[:]
+        value = "%s" % (value,)
+        if value:
+            self.appendChild(Text(value))
+
+    text = property(_get_text, _set_text)
+    textContent = property(_get_text, _set_text)
+
+    def _get_html(self):
+        return ''.join(c.outerHTML for c in self.childNodes)
+
+    def _set_html(self, value):
+        self._set_text('')
+        value = "%s" % (value,)
+        if value:
+            for node in parse_html(value):
+                self.appendChild(node)
+
+    html = property(_get_html, _set_html)
+    innerHTML = property(_get_html, _set_html)
+
+    def iter_elements(self):
+        """Depth first iteration over descendant elements"""
+        stack = list(reversed(self.childNodes))
+        while stack:
+            node = stack.pop()
+            if node.nodeType == ELEMENT_NODE:
+                yield node
+                stack.extend(reversed(node.childNodes))
+
+    def get(self, selector=None):
+        """Brython's document.get(selector=...). Only "tag" and "tag[attr]" selectors"""
+        attr = None
+        if selector.endswith(']'):
+            selector, attr = selector[:-1].split('[')
+        name = selector.upper()
+        return [e for e in self.iter_elements()
+                if e.nodeName == name and (attr is None or attr in e._attrs)]
+
+
+class Text(Node):
+    nodeType = TEXT_NODE
+    nodeName = '#text'
+
+    def __init__(self, data=''):
+        super(Text, self).__init__()
+        object.__setattr__(self, 'data', data)
+
+    @property
+    def text(self):
+        return self.data
+
+    @text.setter
+    def text(self, value):
+        object.__setattr__(self, 'data', "%s" % (value,))
+
+    textContent = text
+
+    @property
+    def outerHTML(self):
+        parent = self.parentNode
+        if parent is not None and parent.nodeName in RAW_TEXT_ELEMENTS:
+            return self.data
+        return escape_text(self.data)
+
+    def _shallow_clone(self):
+        return Text(self.data)
+
+
+class Comment(Node):
+    nodeType = COMMENT_NODE
+    nodeName = '#comment'
+
+    def __init__(self, data=''):
+        super(Comment, self).__init__()
+        object.__setattr__(self, 'data', data)
+
+    @property
+    def outerHTML(self):
+        return '<!--%s-->' % (self.data,)
+
+    def _shallow_clone(self):
+        return Comment(self.data)
+
+
+class Element(Node):
+    """
+    Element. Like Brython's DOMNode, unknown attributes are read from and
+    written to the element's attributes (elem.a = 1 -> <x a="1">).
+    """
+    nodeType = ELEMENT_NODE
+
+    def __init__(self, nodeName):
+        super(Element, self).__init__()
+        object.__setattr__(self, 'nodeName', nodeName)
+        object.__setattr__(self, '_attrs', {})
+        object.__setattr__(self, '_events', {})
+
+    def __getattr__(self, name):
+        attrs = self.__dict__.get('_attrs')
+        if attrs is not None and name in attrs:
+            return attrs[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_') or hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            self.setAttribute(name, value)
+
+    def __repr__(self):
+        return '<Element %s>' % (self.nodeName,)
+
+    @property
+    def tagName(self):
+        return self.nodeName
+
+    @property
+    def attributes(self):
+        return [Attr(k, v) for k, v in self._attrs.items()]
+
+    def getAttribute(self, name):
+        return self._attrs.get(name)
+
+    def hasAttribute(self, name):
+        return name in self._attrs
+
+    def setAttribute(self, name, value):
+        self._attrs[name] = "%s" % (value,)
+
+    def removeAttribute(self, name):
+        self._attrs.pop(name, None)
+
+    @property
+    def outerHTML(self):
+        tag = self.nodeName.lower()
+        attrs = ''.join(' %s="%s"' % (k, escape_attr(v)) for k, v in self._attrs.items())
+        if self.nodeName in VOID_ELEMENTS:
+            return '<%s%s>' % (tag, attrs)
+        return '<%s%s>%s</%s>' % (tag, attrs, self.html, tag)
+
+    def _shallow_clone(self):
+        clone = Element(self.nodeName)
+        clone._attrs.update(self._attrs)
+        return clone
+
+    # Events
+    def bind(self, event, callback):
+        self._events.setdefault(event, []).append(callback)
+        return self
+
+    def unbind(self, event, callback=None):
+        if callback is None:
+            self._events.pop(event, None)
+        elif callback in self._events.get(event, []):
+            self._events[event].remove(callback)
+
+    def events(self, event):
+        return list(self._events.get(event, []))
+
+    def trigger(self, event, **data):
+        """Dispatches a fake event of type event to the bound callbacks"""
+        ev = Event(event, self, **data)
+        for callback in self.events(event):
+            callback(ev)
+        return ev
+
+
+class DocumentFragment(Node):
+    nodeType = FRAGMENT_NODE
+    nodeName = '#document-fragment'
+
+    def _shallow_clone(self):
+        return DocumentFragment()
+
+
+class Event(object):
+
+    def __init__(self, type_, target, **data):
+        self.type = type_
+        self.target = target
+        self.__dict__.update(data)
+
+    def preventDefault(self):
+        pass
+
+    def stopPropagation(self):
+        pass
+
+
+class Document(Node):
+    nodeType = DOCUMENT_NODE
+    nodeName = '#document'
+
+    def __init__(self):
+        super(Document, self).__init__()
+        self.body = None
+
+    def createElement(self, tag):
+        return Element(tag.upper())
+
+    def createTextNode(self, text):
+        return Text(text)
+
+    def createComment(self, text):
+        return Comment(text)
+
+    def createDocumentFragment(self):
+        return DocumentFragment()
+
+    def getElementById(self, id_):
+        for elem in self.iter_elements():
+            if elem._attrs.get('id') == id_:
+                return elem
+        return None
+
+    def __getitem__(self, id_):
+        elem = self.getElementById(id_)
+        if elem is None:
+            raise KeyError(id_)
+        return elem
+
+    def __contains__(self, id_):
+        return self.getElementById(id_) is not None
+
+    @property
+    def html(self):
+        return self.body.html
+
+
+def _index(nodes, node):
+    for i, n in enumerate(nodes):
+        if n is node:
+            return i
+    raise ValueError("Node is not a child of this node")
+
+
+class _FragmentParser(HTMLParser):
+    """Builds headless nodes from an HTML fragment (for innerHTML)"""
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.root = DocumentFragment()
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        elem = Element(tag.upper())
+        for name, value in attrs:
+            elem.setAttribute(name, '' if value is None else value)
+        self.stack[-1].appendChild(elem)
+        if elem.nodeName not in VOID_ELEMENTS:
+            self.stack.append(elem)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag.upper() not in VOID_ELEMENTS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        name = tag.upper()
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].nodeName == name:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        parent = self.stack[-1]
+        last = parent.lastChild
+        if last is not None and last.nodeType == TEXT_NODE:
+            object.__setattr__(last, 'data', last.data + data)
+        else:
+            parent.appendChild(Text(data))
+
+    def handle_comment(self, data):
+        self.stack[-1].appendChild(Comment(data))
+
+
+def parse_html(html):
+    """Returns the list of top level nodes of an HTML fragment"""
+    parser = _FragmentParser()
+    parser.feed(html)
+    parser.close()
+    nodes = list(parser.root.childNodes)
+    for node in nodes:
+        object.__setattr__(node, 'parentNode', None)
+    return nodes
+
+
+class DOMParser(object):
+    """XML only DOMParser (what TemplateProcessor needs)"""
+
+    def parseFromString(self, data, mimetype="text/xml"):
+        doc = Document()
+        stack = [doc]
+
+        def start(name, attrs):
+            elem = Element(name)
+            # ordered_attributes: [name1, value1, name2, value2...]
+            for i in range(0, len(attrs), 2):
+                elem.setAttribute(attrs[i], attrs[i + 1])
+            stack[-1].appendChild(elem)
+            stack.append(elem)
+
+        def end(name):
+            stack.pop()
+
+        def chars(data):
+            parent = stack[-1]
+            if parent is doc:
+                return
+            last = parent.lastChild
+            if last is not None and last.nodeType == TEXT_NODE:
+                object.__setattr__(last, 'data', last.data + data)
+            else:
+                parent.appendChild(Text(data))
+
+        parser = expat.ParserCreate()
+        parser.ordered_attributes = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chars
+        parser.Parse(data, True)
+        return doc
+
+
+class _Constructor(object):
+    """Brython's JS constructor wrapper (window.DOMParser.new())"""
+
+    def __init__(self, cls):
+        self.cls = cls
+
+    def new(self, *args):
+        return self.cls(*args)
+
+
+class Performance(object):
+
+    def __init__(self, window):
+        self.window = window
+
+    def now(self):
+        return self.window.clock()
+
+
+class Brython(object):
+
+    @staticmethod
+    def DOMNode(node):
+        return node
+
+
+class Window(object):
+    """
+    Headless window. requestAnimationFrame and timers are driven by a virtual
+    clock: run_frames() runs pending animation frames, advance(ms) moves the
+    clock and fires due timers.
+    """
+    headless = True
+
+    def __init__(self, document):
+        self.document = document
+        self.DOMParser = _Constructor(DOMParser)
+        self.__BRYTHON__ = Brython()
+        self.performance = Performance(self)
+        self.location = Location()
+        self.reset()
+
+    def reset(self):
+        self._frames = []
+        self._timers = {}
+        self._timer_id = 0
+        self._time = 0.0
+        self._perf0 = time.perf_counter()
+
+    def clock(self):
+        """Milliseconds: virtual time plus real elapsed time"""
+        return self._time + (time.perf_counter() - self._perf0) * 1000
+
+    def requestAnimationFrame(self, callback):
+        self._frames.append(callback)
+        return len(self._frames)
+
+    def run_frames(self, max_frames=1000):
+        """Runs the pending animation frames (and the ones they request). Returns the number of frames run"""
+        n = 0
+        while self._frames and n < max_frames:
+            frames, self._frames = self._frames, []
+            now = self.clock()
+            for callback in frames:
+                callback(now)
+            n += 1
+        return n
+
+    def _add_timer(self, callback, ms, repeat):
+        self._timer_id += 1
+        self._timers[self._timer_id] = [self._time + ms, ms, callback, repeat]
+        return self._timer_id
+
+    def setTimeout(self, callback, ms=0):
+        return self._add_timer(callback, ms, False)
+
+    def setInterval(self, callback, ms):
+        return self._add_timer(callback, ms, True)
+
+    def clearTimeout(self, timer_id):
+        self._timers.pop(timer_id, None)
+
+    clearInterval = clearTimeout
+
+    def advance(self, ms):
+        """Moves the virtual clock ms forward, firing due timers in order"""
+        end = self._time + ms
+        while True:
+            due = [(t[0], tid) for tid, t in self._timers.items() if t[0] <= end]
+            if not due:
+                break
+            when, tid = min(due)
+            timer = self._timers[tid]
+            self._time = max(self._time, when)
+            if timer[3]:
+                timer[0] += timer[1]
+            else:
+                del self._timers[tid]
+            timer[2]()
+        self._time = end
+
+
+class Location(object):
+    href = 'about:blank'
+    hash = ''
+    search = ''
+
+
+document = Document()
+document.body = document.createElement('body')
+document.appendChild(document.body)
+window = Window(document)
+
+
+def install():
+    """
+    Registers a `browser` module (document, window, alert, timer...) backed
+    by this DOM, so modules written for Brython can be imported under
+    CPython. Returns the module (the existing one if already importable).
+    """
+    import sys
+    import types
+    if 'browser' in sys.modules:
+        return sys.modules['browser']
+    browser = types.ModuleType('browser')
+    browser.document = document
+    browser.window = window
+    browser.alert = lambda message='': None
+    browser.html = None
+    browser.console = None
+    timer = types.ModuleType('browser.timer')
+    timer.set_interval = window.setInterval
+    timer.set_timeout = window.setTimeout
+    timer.clear_interval = window.clearInterval
+    timer.clear_timeout = window.clearTimeout
+    browser.timer = timer
+    sys.modules['browser'] = browser
+    sys.modules['browser.timer'] = timer
+    return browser
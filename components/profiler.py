@@ -0,0 +1,163 @@
+"""
+Profiler for components: while started it measures mount time per
+component class, components created, observer notifications, expression
+evaluations (bindings) and DOM operations (dom_stats), and the time spent
+in each binding. Property.notify_observers, Component.mount and the
+binding classes are patched while it runs.
+
+    profiler = Profiler()
+    with profiler:
+        root.add_html(html)
+    report = profiler.report()
+
+Each DOM event (in scope, if given) starts a new session and calls
+on_session(report) when it has been handled (the editor's PerfPanel).
+"""
+from .base import (Property, Component, HTMLComp, ObjectWithProperties, ChainPropBinding, NodeBinding, DynNode,
+                   dom_stats, now_ms)
+
+
+class Profiler(object):
+
+    def __init__(self, scope=None, on_session=None):
+        self.scope = scope  # Only events of components under scope start sessions
+        self.on_session = on_session
+        self.running = False
+        self._saved = None
+        self._depth = 0  # Nested event handlers
+        self.reset()
+
+    def reset(self, label='render'):
+        self.label = label
+        self.mounts = {}  # {class name: [count, ms]}
+        self.bindings = {}  # {binding label: [count, ms]}
+        self.notifications = 0
+        self.evaluations = 0
+        self.start_ms = now_ms()
+        self.start_cnt = ObjectWithProperties.cnt
+        dom_stats.reset()
+
+    def start(self):
+        if self.running:
+            return
+        profiler = self
+        notify_observers = Property.notify_observers
+        mount = Component.mount
+        chain_call = ChainPropBinding.__call__
+        node_call = NodeBinding.__call__
+        event_callback = HTMLComp._domevent_callback
+
+        def _notify_observers(prop, iid, instance, value):
+            observers = prop.observers.get(iid)
+            # The outermost call sets dom_stats.trigger and calls again (see DOMStats.notify)
+            if observers and dom_stats.trigger is not None:
+                profiler.notifications += len(observers)
+            return notify_observers(prop, iid, instance, value)
+
+        def _mount(comp):
+            start = now_ms()
+            try:
+                return mount(comp)
+            finally:
+                profiler._add(profiler.mounts, comp.__class__.__name__, now_ms() - start)
+
+        def _chain_call(binding, value, instance):
+            start = now_ms()
+            try:
+                return chain_call(binding, value, instance)
+            finally:
+                label = "%s.%s = {%s}" % (binding.owner.__class__.__name__, binding.propname,
+                                          getattr(binding.expression, 'expression', '?'))
+                profiler._evaluated(label, now_ms() - start)
+
+        def _node_call(binding, value=None, instance=None):
+            start = now_ms()
+            try:
+                return node_call(binding, value, instance)
+            finally:
+                node = binding.node
+                label = "%s <%s> %s = {%s}" % (node.root.__class__.__name__, node.tag.lower(), binding.name,
+                                              getattr(binding.expression, 'expression', '?'))
+                profiler._evaluated(label, now_ms() - start)
+
+        def _domevent_callback(comp, event, expression, context):
+            session = profiler._depth == 0 and profiler._in_scope(comp)
+            if session:
+                profiler.reset('%s %s' % (getattr(event, 'type', 'event'), comp.tag.lower()))
+            profiler._depth += 1
+            try:
+                return event_callback(comp, event, expression, context)
+            finally:
+                profiler._depth -= 1
+                profiler.evaluations += 1
+                if session and profiler.on_session is not None:
+                    profiler.pause(profiler.on_session, profiler.report())
+
+        self._saved = (notify_observers, mount, chain_call, node_call, event_callback)
+        Property.notify_observers = _notify_observers
+        Component.mount = _mount
+        ChainPropBinding.__call__ = _chain_call
+        NodeBinding.__call__ = DynNode.__call__ = _node_call
+        HTMLComp._domevent_callback = _domevent_callback
+        dom_stats.enabled = True
+        self.running = True
+
+    def stop(self):
+        if not self.running:
+            return
+        (Property.notify_observers, Component.mount, ChainPropBinding.__call__, NodeBinding.__call__,
+         HTMLComp._domevent_callback) = self._saved
+        DynNode.__call__ = NodeBinding.__call__
+        self._saved = None
+        dom_stats.enabled = False
+        self.running = False
+
+    def pause(self, func, *args):
+        """Runs func(*args) without profiling it (e.g. to show a report)"""
+        self.stop()
+        try:
+            return func(*args)
+        finally:
+            self.start()
+
+    def __enter__(self):
+        self.reset()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _add(self, table, key, ms):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += ms
+
+    def _evaluated(self, label, ms):
+        self.evaluations += 1
+        self._add(self.bindings, label, ms)
+
+    def _in_scope(self, comp):
+        if self.scope is None:
+            return True
+        while comp is not None:
+            if comp is self.scope:
+                return True
+            comp = comp.parent
+        return False
+
+    def report(self, top=10):
+        """Dict with the counters of the session and its top most expensive bindings"""
+        bindings = sorted(self.bindings.items(), key=lambda item: item[1][1], reverse=True)
+        mounts = sorted(self.mounts.items(), key=lambda item: item[1][1], reverse=True)
+        return {'label': self.label,
+                'ms': now_ms() - self.start_ms,
+                'created': ObjectWithProperties.cnt - self.start_cnt,
+                'notifications': self.notifications,
+                'evaluations': self.evaluations,
+                'dom_ops': dom_stats.total(),
+                'dom_by_operation': dom_stats.by('operation'),
+                'mounts': [(name, count, ms) for name, (count, ms) in mounts],
+                'bindings': [(label, count, ms) for label, (count, ms) in bindings[:top]]}
@@ -0,0 +1,213 @@
+"""
+Workload recorder and replayer. A Recorder logs the property writes and DOM
+events of a mounted tree as a compact JSON serializable trace; replay() runs
+the same sequence against a freshly mounted tree, at full speed. With the
+headless DOM (CPython) a captured session becomes a repeatable benchmark:
+
+    recorder = Recorder(root)
+    with recorder:
+        ...  # use the app
+    recorder.save('session.json')
+
+    # Later, under CPython
+    stats = replay(load('session.json'), FilteredList)
+
+Only top level changes are recorded: writes and events that happen while a
+recorded one is handled (observers, event expressions) are its consequences
+and are made again by the replay. Components are found by their path from
+the root: cids where they have one, child indexes otherwise.
+"""
+import json
+
+from .base import (Property, BaseComponent, HTMLComp, BrowserDOMRender, Register, Scheduler, initialize_comps_classes,
+                   scheduler, now_ms)
+
+SET, EVENT = 'set', 'event'
+FORM_TAGS = ('INPUT', 'TEXTAREA', 'SELECT')
+# Set by the framework itself
+INTERNAL_PROPS = ('is_mounted', 'style', '_rendered_style')
+
+
+def component_path(root, comp):
+    """Path from root to comp (cids and child indexes), None if comp isn't in root's tree"""
+    path = []
+    while comp is not root:
+        parent = comp.parent
+        if parent is None:
+            return None
+        owner = parent.root
+        ids = getattr(owner, 'ids', None)
+        if comp.cid is not None and ids is not None and ids.get(comp.cid) is comp:
+            path.append(comp.cid)
+            comp = owner
+        else:
+            path.append(parent.children.index(comp))
+            comp = parent
+    path.reverse()
+    return path
+
+
+def find_component(root, path):
+    """Component at path from root (see component_path), None if there's none"""
+    comp = root
+    try:
+        for step in path:
+            comp = comp.ids[step] if isinstance(step, str) else comp.children[step]
+    except (KeyError, IndexError, AttributeError, TypeError):
+        return None
+    return comp
+
+
+class Recorder(object):
+    """
+    Records [ms, kind, class name, path, name, value] entries:
+    kind SET: property name set to value.
+    kind EVENT: DOM event name, value is the value of form elements.
+    Property.__set__, _domevent_callback and Scheduler._notify are patched
+    while recording.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = []
+        self.skipped = 0  # Writes with values that can't be serialized
+        self.start_ms = None
+        self._depth = 0
+        self._saved = None
+        self._names = {}  # {class: {id(prop): name}}
+
+    def start(self):
+        recorder = self
+        prop_set = Property.__set__
+        event_callback = HTMLComp._domevent_callback
+        notify = Scheduler._notify
+
+        def __set__(prop, instance, value):
+            if recorder._depth:
+                return prop_set(prop, instance, value)
+            recorder._record_set(prop, instance, value)
+            recorder._depth += 1
+            try:
+                return prop_set(prop, instance, value)
+            finally:
+                recorder._depth -= 1
+
+        def _domevent_callback(comp, event, expression, context):
+            if not recorder._depth:
+                recorder._record_event(comp, event)
+            recorder._depth += 1
+            try:
+                return event_callback(comp, event, expression, context)
+            finally:
+                recorder._depth -= 1
+
+        def _notify(sched, prop, instance, priority):
+            # Deferred notifications (NORMAL/IDLE lanes) of a recorded write
+            recorder._depth += 1
+            try:
+                return notify(sched, prop, instance, priority)
+            finally:
+                recorder._depth -= 1
+
+        self._saved = (prop_set, event_callback, notify)
+        self.start_ms = now_ms()
+        Property.__set__ = __set__
+        HTMLComp._domevent_callback = _domevent_callback
+        Scheduler._notify = _notify
+
+    def stop(self):
+        if self._saved is not None:
+            Property.__set__, HTMLComp._domevent_callback, Scheduler._notify = self._saved
+            self._saved = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _name(self, prop, instance):
+        cls = instance.__class__
+        names = self._names.get(cls)
+        if names is None:
+            names = self._names[cls] = {}
+            for name in dir(cls):
+                attr = getattr(cls, name)
+                if isinstance(attr, Property) and name not in INTERNAL_PROPS:
+                    names[id(attr)] = name
+        return names.get(id(prop))
+
+    def _add(self, kind, comp, name, value):
+        path = component_path(self.root, comp)
+        if path is None or name is None:
+            return
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            self.skipped += 1
+            return
+        self.entries.append([round(now_ms() - self.start_ms, 3), kind, comp.__class__.__name__, path, name, value])
+
+    def _record_set(self, prop, instance, value):
+        if isinstance(instance, BaseComponent):
+            self._add(SET, instance, self._name(prop, instance), value)
+
+    def _record_event(self, comp, event):
+        elem = comp.elem
+        value = None
+        if getattr(elem, 'nodeName', None) in FORM_TAGS:
+            value = elem.value
+        self._add(EVENT, comp, getattr(event, 'type', None), value)
+
+    def trace(self):
+        return {'version': 1, 'root': self.root.__class__.__name__, 'entries': self.entries}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f, separators=(',', ':'))
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def replay(trace, comp_cls=None, root=None, **props):
+    """
+    Runs trace against root or, by default, a new comp_cls (the recorded root
+    class if None) mounted with props, rendering directly. Events are
+    dispatched with elem.trigger (headless DOM). Returns a stats dict:
+    entries, missing (components not found), ms.
+    """
+    initialize_comps_classes()
+    direct = BrowserDOMRender.direct
+    BrowserDOMRender.direct = True
+    try:
+        if root is None:
+            if comp_cls is None:
+                comp_cls = Register.get_component_class(trace['root'].upper())
+            root = comp_cls()
+            root.root = root
+            for name, value in props.items():
+                setattr(root, name, value)
+            root.mount()
+            scheduler.flush()
+        missing = 0
+        start = now_ms()
+        for ms, kind, cls_name, path, name, value in trace['entries']:
+            comp = find_component(root, path)
+            if comp is None or comp.__class__.__name__ != cls_name:
+                missing += 1
+                continue
+            if kind == SET:
+                setattr(comp, name, value)
+            else:
+                if value is not None:
+                    comp.elem.value = value
+                comp.elem.trigger(name)
+            scheduler.flush()
+        elapsed = now_ms() - start
+    finally:
+        BrowserDOMRender.direct = direct
+    return {'entries': len(trace['entries']), 'missing': missing, 'ms': elapsed}
@@ -0,0 +1,339 @@
+"""
+Server side rendering. Runs components under CPython against the headless DOM
+(components.headless) and serializes them to HTML that the client hydrates:
+render() adopts the prerendered nodes instead of creating new ones.
+
+    from components.server import render_to_string
+    html = render_to_string(FilteredList, initial_items=['a', 'b'])
+
+stream_render() yields the same markup in chunks without building the tree.
+FragmentCache serves identical subtrees (same component class and props)
+from a content addressed cache (see prerender.py).
+"""
+import hashlib
+import os
+import re
+from collections import OrderedDict
+
+from . import base
+from .base import (Register, BrowserDOMRender, RefMap, ObjectWithProperties, initialize_comps_classes,
+                   scheduler, teardown, TEXT, STATIC, DYNODE, DYN_ATTR, DOMEVENTS)
+from .headless import escape_text, escape_attr, parse_html, VOID_ELEMENTS
+
+
+def _ensure_initialized(comp_cls):
+    Register.add(comp_cls)
+    initialize_comps_classes()
+
+
+def render_to_string(comp_cls, **props):
+    """
+    Mounts a comp_cls root component with props and returns its HTML.
+    Props are serialized as {python literal} attributes of the root element,
+    so they must be literals (str, numbers, lists, dicts...). They're read back
+    when the client mounts (hydrates) the component.
+    """
+    _ensure_initialized(comp_cls)
+    tag = comp_cls.tag if comp_cls.rendertag is None else comp_cls.rendertag
+    elem = base.document.createElement(tag)
+    for name, value in props.items():
+        elem.setAttribute(name, "{%r}" % (value,))
+
+    direct = BrowserDOMRender.direct
+    BrowserDOMRender.direct = True
+    try:
+        comp = comp_cls(elem)
+        comp.root = comp
+        comp.mount()
+        scheduler.flush()
+    finally:
+        BrowserDOMRender.direct = direct
+    html = elem.outerHTML
+    # Releases the tree: bindings, RefMap entries and property values
+    teardown((comp,), True)
+    return html
+
+
+class _StreamNode(object):
+    """Stands for a classic HTML node (self/this/parent in expressions) while streaming"""
+    __slots__ = ('tag', 'parent', 'root')
+
+    def __init__(self, tag, parent, root):
+        self.tag = tag
+        self.parent = parent
+        self.root = root
+
+    @property
+    def elem(self):
+        return self
+
+
+def stream_render(comp_cls, chunk_size=8192, encoding=None, cache=None, **props):
+    """
+    Generator version of render_to_string: walks the template instructions
+    and yields the HTML in chunks of about chunk_size characters (bytes if
+    encoding is given, e.g. to return it from a WSGI app) as subtrees are
+    completed, without building the DOM tree. Expressions are evaluated with
+    the usual self/parent/root/this context. Memory is proportional to the
+    depth of the tree.
+    Components with streamable = False (their content is built in callbacks)
+    are mounted and serialized as a unit.
+    With a FragmentCache, components (the root and nested ones) already
+    rendered with the same props are served from it.
+    """
+    _ensure_initialized(comp_cls)
+    buf, size = [], 0
+    for part in _stream_root(comp_cls, props, cache):
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            chunk = ''.join(buf)
+            buf, size = [], 0
+            yield chunk if encoding is None else chunk.encode(encoding)
+    if buf:
+        chunk = ''.join(buf)
+        yield chunk if encoding is None else chunk.encode(encoding)
+
+
+def _stream_root(comp_cls, props, cache):
+    if cache is None:
+        for part in _stream_root_component(comp_cls, props, None):
+            yield part
+        return
+    # The root element also carries the props, it's cached apart from nested ones
+    key = cache.key(comp_cls, props, root=True)
+    html = cache.get(key)
+    if html is None:
+        html = ''.join(_stream_root_component(comp_cls, props, cache))
+        cache.put(key, html)
+    yield html
+
+
+def _stream_root_component(comp_cls, props, cache):
+    if not comp_cls.streamable:
+        yield render_to_string(comp_cls, **props)
+        return
+    comp = comp_cls()
+    comp.root = comp
+    attrs = [(name, "{%r}" % (value,)) for name, value in props.items()]
+    for name, value in props.items():
+        setattr(comp, name, value)
+    try:
+        for part in _stream_component(comp, attrs, cache):
+            yield part
+    finally:
+        _release(comp)
+
+
+def _stream_component(comp, attrs, cache):
+    """Custom component: its element and its template"""
+    tag = (comp.tag if comp.rendertag is None else comp.rendertag).lower()
+    elem_id = "%s_%s" % (comp.__class__.__name__, comp.iid)
+    attrs = list(attrs) + [('id', elem_id), ('rd', '1')]
+    yield _start_tag(tag, attrs)
+    if len(comp.style):
+        yield '<style rd="1">%s</style>' % (comp.style.replace(":host", "#%s" % (elem_id,)),)
+    for part in _stream_instructions(comp.instructions, comp, comp, cache):
+        yield part
+    yield '</%s>' % (tag,)
+
+
+def _stream_instructions(instructions, parent, root, cache):
+    for instruction in instructions:
+        if instruction[0] == TEXT:
+            yield escape_text(instruction[1])
+            continue
+        if instruction[0] == STATIC:
+            for part in _stream_instructions(instruction[1], parent, root, cache):
+                yield part
+            continue
+        nodename = instruction[1]
+        if nodename in Register._reg_names:
+            for part in _stream_custom(instruction, parent, root, cache):
+                yield part
+        elif nodename == DYNODE:
+            node = _StreamNode(nodename, parent, root)
+            value = instruction[2](root, parent, node, node)
+            yield '<dynode>%s</dynode>' % (_inner_html(value),)
+        else:
+            node = _StreamNode(nodename, parent, root)
+            attrs = []
+            for attr in instruction[2]:
+                name, value, type_ = attr[0:3]
+                if type_ == DYN_ATTR:
+                    if name in DOMEVENTS:
+                        continue
+                    value = "%s" % (value(root, parent, node, node),)
+                attrs.append((name, value))
+            attrs.append(('rd', '1'))
+            tag = nodename.lower()
+            yield _start_tag(tag, attrs)
+            if nodename not in VOID_ELEMENTS:
+                for part in _stream_instructions(instruction[3], node, root, cache):
+                    yield part
+                yield '</%s>' % (tag,)
+
+
+def _stream_custom(instruction, parent, root, cache):
+    comp_cls = Register.get_component_class(instruction[1])
+    # Props from template attributes, evaluated in the outer context
+    props = []
+    for attr in instruction[2]:
+        name, value, type_ = attr[0:3]
+        if name == 'cid':
+            continue
+        props.append((name, value, type_))
+
+    comp = comp_cls()
+    try:
+        comp.root = comp
+        comp.parent = parent
+        values = {}
+        for name, value, type_ in props:
+            if type_ == DYN_ATTR:
+                value = value(root, parent, comp, comp.elem)
+            values[name] = value
+        key = None
+        if cache is not None:
+            key = cache.key(comp_cls, values)
+            html = cache.get(key)
+            if html is not None:
+                yield html
+                return
+        for name, value in values.items():
+            setattr(comp, name, value)
+        if comp_cls.streamable:
+            parts = _stream_component(comp, [], cache)
+        else:
+            parts = [_mount_to_string(comp)]
+        if key is None:
+            for part in parts:
+                yield part
+        else:
+            html = ''.join(parts)
+            cache.put(key, html)
+            yield html
+    finally:
+        _release(comp)
+
+
+def _mount_to_string(comp):
+    direct = BrowserDOMRender.direct
+    BrowserDOMRender.direct = True
+    try:
+        comp.mount()
+        scheduler.flush()
+    finally:
+        BrowserDOMRender.direct = direct
+    html = comp.elem.outerHTML
+    teardown((comp,), True)
+    return html
+
+
+def _inner_html(value):
+    """value as serialized after setting it as innerHTML (as DYNODE bindings do)"""
+    value = "%s" % (value,)
+    if '<' not in value and '&' not in value:
+        return escape_text(value)
+    return ''.join(node.outerHTML for node in parse_html(value))
+
+
+def _start_tag(tag, attrs):
+    return '<%s%s>' % (tag, ''.join(' %s="%s"' % (k, escape_attr(v)) for k, v in attrs))
+
+
+def _release(comp):
+    """Drops the references and property values of a streamed component"""
+    RefMap.remove(comp)
+    iid = comp.iid
+    for propname in comp._prop_list:
+        prop = getattr(comp.__class__, propname)
+        prop.storage.pop(iid, None)
+        prop.observers.pop(iid, None)
+
+
+class FragmentCache(object):
+    """
+    Content addressed LRU cache of rendered components: the key is a hash of
+    the component class and its prop values. Holds up to maxsize fragments in
+    memory and, if directory is given, keeps every fragment there too (shared
+    between processes). Component ids in a fragment are renumbered each time
+    it's served so they stay unique in the page.
+    """
+
+    def __init__(self, maxsize=1024, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.fragments = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(comp_cls, props, root=False):
+        data = "%s.%s|%r|%s" % (comp_cls.__module__, comp_cls.__name__, sorted(props.items()), root)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        html = self.fragments.get(key)
+        if html is not None:
+            self.fragments.move_to_end(key)
+            self.hits += 1
+            return renumber_ids(html)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + '.html')
+            if os.path.exists(path):
+                with open(path) as f:
+                    html = f.read()
+                self._store(key, html)
+                self.disk_hits += 1
+                return renumber_ids(html)
+        self.misses += 1
+        return None
+
+    def put(self, key, html):
+        self._store(key, html)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + '.html')
+            tmp = "%s.%s.tmp" % (path, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(html)
+            os.replace(tmp, path)
+
+    def _store(self, key, html):
+        self.fragments[key] = html
+        self.fragments.move_to_end(key)
+        while len(self.fragments) > self.maxsize:
+            self.fragments.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'size': len(self.fragments), 'pid': os.getpid()}
+
+
+# Start tags (attribute values are double quoted, with " escaped) and their id attribute
+REGEX_TAG = re.compile(r'<[A-Za-z][^\s/>]*(?:\s+[^\s"=/>]+(?:="[^"]*")?)*\s*/?>')
+REGEX_ID = re.compile(r' id="([A-Za-z_][A-Za-z0-9_]*)_([0-9]+)"')
+# Scoped styles of components (see Component._mount_style)
+REGEX_STYLE = re.compile(r'(<style[^>]* rd="1"[^>]*>)(.*?)(</style>)', re.S)
+
+
+def renumber_ids(html):
+    """Gives new ClassName_iid ids to the components in html: their id attributes
+    and the #id selectors of their scoped styles (not texts or other attributes)"""
+    ids = {}
+    for tag in REGEX_TAG.finditer(html):
+        for m in REGEX_ID.finditer(tag.group(0)):
+            old = "%s_%s" % m.groups()
+            if old not in ids:
+                ids[old] = "%s_%s" % (m.group(1), ObjectWithProperties.cnt)
+                ObjectWithProperties.cnt += 1
+    if not ids:
+        return html
+    new_id = lambda m: ' id="%s"' % (ids["%s_%s" % m.groups()],)
+    html = REGEX_TAG.sub(lambda tag: REGEX_ID.sub(new_id, tag.group(0)), html)
+    selector = re.compile(r'#(%s)\b' % '|'.join(re.escape(k) for k in ids))
+    new_style = lambda m: m.group(1) + selector.sub(lambda s: '#' + ids[s.group(1)], m.group(2)) + m.group(3)
+    return REGEX_STYLE.sub(new_style, html)
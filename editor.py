@@ -1,9 +1,123 @@
 """
 Editor component to edit and render Components code
 """
-from components import Component, Property, Register, initialize_comps_classes
+import re
+
+from components import Component, Property, Register, RefMap, initialize_comps_classes
+from components.base import ChainPropBinding
+from components.profiler import Profiler
 from browser import document, window
 
+REGEX_CLASS = re.compile(r"class\s+([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def split_blocks(code):
+    """
+    {class name: source} of the top level classes in code. The rest of the
+    top level code (but Register.add calls) is under None.
+    """
+    blocks, name, lines, pending = {}, None, [], []
+    in_string = False
+    for line in code.split('\n'):
+        top_level = not in_string and line[:1] not in ('', ' ', '\t', '#', ')', ']', '}')
+        if (line.count('"""') + line.count("'''")) % 2:
+            in_string = not in_string  # Lines of multiline strings (templates) belong to the block
+        if top_level:
+            if line.startswith('@'):
+                pending.append(line)
+                continue
+            blocks[name] = blocks.get(name, '') + '\n'.join(lines) + '\n'
+            m = REGEX_CLASS.match(line)
+            name = m.group(1) if m is not None else None
+            lines, pending = pending, []
+            if line.startswith('Register.add('):
+                continue
+        lines.append(line)
+    blocks[name] = blocks.get(name, '') + '\n'.join(lines) + '\n'
+    return blocks
+
+
+class HotReloader(object):
+    """
+    Runs the editor's Python code again keeping what didn't change: classes
+    with the same source keep their class object (and their instances stay
+    untouched). Live instances of changed classes are re-mounted in place as
+    instances of the new class, with their Property values and the bindings
+    from the outer template carried over. If code outside classes changed,
+    every class is reloaded.
+    """
+    skip_props = ('is_mounted', 'style', '_rendered_style')
+
+    def __init__(self, builtin=()):
+        self.builtin = list(builtin)  # Classes that are never reloaded (the editor's)
+        self.sources = {}
+        self.removed = []  # Names of the classes gone in the last reload
+
+    def reload(self, code, container):
+        """Runs code and updates the components in container. Returns the names of the reloaded classes"""
+        sources = split_blocks(code)
+        old = dict((c.__name__, c) for c in Register.reg if c not in self.builtin)
+        for comp_cls in old.values():
+            Register.remove(comp_cls)
+        namespace = {}
+        try:
+            exec(code, namespace)
+        except Exception:
+            # Back to the old classes
+            for comp_cls in list(Register.reg):
+                if comp_cls not in self.builtin:
+                    Register.remove(comp_cls)
+            for comp_cls in old.values():
+                Register.add(comp_cls)
+            raise
+
+        same_code = sources.get(None) == self.sources.get(None)
+        changed = {}
+        for comp_cls in list(Register.reg):
+            name = comp_cls.__name__
+            if comp_cls in self.builtin or name not in old:
+                continue
+            if same_code and name in sources and sources[name] == self.sources.get(name):
+                # Unchanged: keep the old class
+                Register.remove(comp_cls)
+                Register.add(old[name])
+                if namespace.get(name) is comp_cls:
+                    namespace[name] = old[name]
+            else:
+                changed[old[name]] = comp_cls
+        registered = [c.__name__ for c in Register.reg]
+        self.removed = [name for name in old if name not in registered]
+        self.sources = sources
+        initialize_comps_classes()
+
+        stack = list(container.children)
+        while stack:
+            comp = stack.pop()
+            if comp.__class__ in changed:
+                self.remount(comp, changed[comp.__class__])
+            elif comp.children:
+                stack.extend(comp.children)
+        return [c.__name__ for c in changed.values()]
+
+    def remount(self, comp, new_cls):
+        """Replaces comp by a new_cls instance in place"""
+        new = new_cls()
+        outer = [b for b in (comp._bindings or ()) if isinstance(b[2], ChainPropBinding) and b[2].owner is comp]
+        values = [(name, getattr(comp, name)) for name in comp._prop_list
+                  if name not in self.skip_props and name in new_cls._prop_list]
+        comp.parent.replace(comp, new)
+        for name, value in values:
+            setattr(new, name, value)
+        # Bindings of the outer template: props set from expressions
+        for source, propname, binding in outer:
+            context = dict(binding.context, self=RefMap.add(new), this=RefMap.add(new.elem))
+            new_binding = ChainPropBinding(new, binding.propname, binding.expression, context, RefMap.add(new))
+            source.bind(propname, new_binding)
+            if new._bindings is None:
+                new._bindings = []
+            new._bindings.append((source, propname, new_binding))
+        return new
+
 
 
 class ComponentEditor(Component):
@@ -20,6 +134,7 @@ class ComponentEditor(Component):
 
                   <div class='panel'>
                       <h3>Result</h3><ResultComponent cid='result'></ResultComponent>
+                      <h3>Performance</h3><PerfPanel cid='perf'></PerfPanel>
                   </div>
                   </ComponentEditor>"""
 
@@ -64,29 +179,50 @@ class ComponentEditor(Component):
 
         window.editor_python = python_editor
         window.editor_html = html_editor
+        self.get('perf').bind('enabled', self.on_profiling)
 
         self.render_code()
 
+    reloader = None
+    profiler = None
+    html_code = None  # Last rendered HTML
+
     def render_code(self):
         python_editor = self.get('e1')
         html_editor = self.get('e2')
-        #Remove old component classes
-        for comp_cls in Register.reg:
-            if comp_cls not in (CodeMirror, ResultComponent, ComponentEditor):
-                Register.remove(comp_cls)
-        
-        python_code = python_editor.get_code()
+        if self.reloader is None:
+            self.reloader = HotReloader((CodeMirror, ResultComponent, PerfPanel, ComponentEditor))
+
+        # Changed classes are reloaded, their instances keep their state
+        result_comp = self.get('result')
+        profiling = self.profiler is not None and self.profiler.running
+        if profiling:
+            self.profiler.reset()
         try:
-            eval(python_code)
+            self.reloader.reload(python_editor.get_code(), result_comp)
         except Exception as e:
             print("Error evaluating code ", e)
-        # Init comp classes again (User must have registered its comps in the code)
-        initialize_comps_classes()
 
-        # Add new html with components in it
-        result_comp = self.get('result')
-        result_comp.remove_all()
-        result_comp.add_html(html_editor.get_code())
+        # Add new html with components in it (only when it changed or has
+        # instances of removed classes)
+        html_code = html_editor.get_code()
+        if html_code != self.html_code or self.reloader.removed:
+            self.html_code = html_code
+            result_comp.remove_all()
+            result_comp.add_html(html_code)
+        if profiling:
+            self.profiler.pause(self.get('perf').show, self.profiler.report())
+
+    def on_profiling(self, enabled, panel):
+        """Starts or stops profiling when the panel is toggled"""
+        if self.profiler is None:
+            # While running each interaction with the result is a session
+            self.profiler = Profiler(scope=self.get('result'), on_session=panel.show)
+        if enabled:
+            self.profiler.reset('enabled')
+            self.profiler.start()
+        else:
+            self.profiler.stop()
 
     def share_code(self):
         python_editor = self.get('e1')
@@ -142,6 +278,62 @@ class ResultComponent(Component):
             }
             """
     
+
+def _escape(text):
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+class PerfPanel(Component):
+    """
+    Report of the last profiler session (the render or an interaction):
+    counters, mount time per class and the most expensive bindings.
+    Profiling is on while the checkbox is checked (enabled).
+    """
+    tag = "PerfPanel"
+    template = """<PerfPanel>
+                  <label><input type='checkbox' cid='toggle' onclick='{root.toggle()}'/> Profile</label>
+                  <div cid='report'></div>
+                  </PerfPanel>"""
+    enabled = Property(False)
+    style = """
+             :host {
+                display: block;
+                background-color:  #fff;
+                border: 10px solid #444;
+                padding: 15px;
+                font-family: monospace;
+            }
+            :host td {padding: 0 10px;}
+            :host .hot {background-color: #fdd;}
+            """
+    hot_ms = 1.0  # Bindings slower than this are highlighted
+
+    def show(self, report):
+        rows = ["<b>%s</b>: %.2f ms, %d components created, %d notifications, %d evaluations, %d DOM ops" %
+                (_escape(report['label']), report['ms'], report['created'], report['notifications'],
+                 report['evaluations'], report['dom_ops'])]
+        if report['dom_by_operation']:
+            rows.append(' '.join('%s: %d' % item for item in sorted(report['dom_by_operation'].items())))
+        if report['mounts']:
+            rows.append("<table><tr><th>Mounted</th><th>count</th><th>ms</th></tr>%s</table>" %
+                        ''.join("<tr><td>%s</td><td>%d</td><td>%.2f</td></tr>" % (_escape(name), count, ms)
+                                for name, count, ms in report['mounts']))
+        if report['bindings']:
+            rows.append("<table><tr><th>Binding</th><th>count</th><th>ms</th></tr>%s</table>" %
+                        ''.join("<tr%s><td>%s</td><td>%d</td><td>%.2f</td></tr>" %
+                                (" class='hot'" if ms >= self.hot_ms else '', _escape(label), count, ms)
+                                for label, count, ms in report['bindings']))
+        self.get('report').elem.html = '<br>'.join(rows)
+
+    def toggle(self):
+        self.enabled = bool(self.get('toggle').elem.checked)
+
+    def on_enabled(self, value, instance):
+        if not value:
+            self.get('report').elem.html = ''
+
+
 Register.add(CodeMirror)
 Register.add(ResultComponent)
+Register.add(PerfPanel)
 Register.add(ComponentEditor)
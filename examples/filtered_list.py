@@ -1,6 +1,7 @@
 TITLE = "Filtered list"
 CODE = ['''
 from components import Register, Component, Property
+from components.custom import SearchIndex
 
 
 # Filter list using input text
@@ -12,18 +13,17 @@ class FilteredList(Component):
     <div>{root.itemslen} items</div>
     </FilteredList>"""
     items = Property([])
-    initial_items = None
+    index = None  # SearchIndex of the initial items
     itemslen = Property(0)
     
     def filter(self):
-        value = self.get('search').elem.value.lower()
-        newitems = [x for x in self.initial_items if value in x.lower() or not len(value)]
-        self.items = newitems
+        if self.index is not None: # No items yet
+            self.items = self.index.search(self.get('search').elem.value)
         
     
     def on_items(self, value, instance):
-        if self.initial_items is None and len(value):
-            self.initial_items = value
+        if self.index is None and len(value):
+            self.index = SearchIndex(value)
         self.itemslen = len(value)
         ulist = self.get('list')
         # Remove all existing children and create new ones according to list. This is not optimal 
@@ -17,9 +17,8 @@ class MyComponent(Component):
   numitems = Property(0)
   
   def filter(self):
-    value = self.get('search').elem.value.lower()
-    newitems = [x for x in self.initial_items if value in x.lower() or not len(value)]
-    self.get('fl').items = newitems
+    # FilteredList searches its index
+    self.get('fl').filtervalue = self.get('search').elem.value
     
   def on_initial_items(self, value, instance):
     print("initial items")
@@ -1,14 +1,15 @@
 TITLE = "Timer"
 CODE = ['''
 from components import Register, Component, Property
-from browser import timer
 
 class MyComponent(Component):
     template = """<MyComponent>Seconds elapsed {root.time}</MyComponent>"""
     time = Property(0)
 
     def on_mount(self):
-        self._timer = timer.set_interval(self.tick,1000)
+        # Shared clock: one timer for every 1s subscriber, ticks are batched
+        # in background (idle) priority. Stopped when unmounted.
+        self.every(1000, self.tick)
 
     def tick(self):
         self.time += 1
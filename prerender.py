@@ -0,0 +1,120 @@
+"""
+Parallel server side prerendering. Run with CPython (3.9+):
+
+    python prerender.py JOBS [--module NAME ...] [--processes N]
+                        [--cache-size N] [--cache-dir DIR]
+
+JOBS is a JSON lines file, one page per line:
+    {"component": "FilteredList", "props": {"initial_items": ["a", "b"]}, "output": "out/list.html"}
+
+component is a registered component name or "module:Class". The modules
+given with --module (those defining and registering the components) are
+imported once per worker process, which also parses every template once.
+Pages are rendered with components.server.stream_render through a
+FragmentCache: components already rendered with the same props (in that
+worker, or by any worker when --cache-dir is given) are not rendered again.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_cache = None
+
+
+def _init_worker(modules, cache_size, cache_dir):
+    global _cache
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    for name in modules:
+        importlib.import_module(name)
+    from components import initialize_comps_classes
+    from components.server import FragmentCache
+    initialize_comps_classes()
+    _cache = FragmentCache(cache_size, cache_dir)
+
+
+def _component_class(name):
+    from components import Register
+    if ':' in name:
+        module, cls_name = name.split(':', 1)
+        return getattr(importlib.import_module(module), cls_name)
+    comp_cls = Register.get_component_class(name.upper())
+    if comp_cls is None:
+        raise ValueError("Component %s is not registered (missing --module?)" % (name,))
+    return comp_cls
+
+
+def render_job(job):
+    """Renders one job in a worker. Returns (output, html or None, seconds, cache stats)"""
+    from components.server import stream_render
+    start = time.perf_counter()
+    comp_cls = _component_class(job['component'])
+    html = ''.join(stream_render(comp_cls, cache=_cache, **job.get('props', {})))
+    output = job.get('output')
+    if output:
+        if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as f:
+            f.write(html)
+        html = None
+    return output, html, time.perf_counter() - start, _cache.stats()
+
+
+def read_jobs(path):
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                jobs.append(json.loads(line))
+    return jobs
+
+
+def prerender(jobs, modules=(), processes=None, cache_size=1024, cache_dir=None):
+    """Renders jobs in a process pool. Returns (results, report dict)"""
+    start = time.perf_counter()
+    results, stats = [], {}
+    with Pool(processes, _init_worker, (list(modules), cache_size, cache_dir)) as pool:
+        for output, html, seconds, worker_stats in pool.imap_unordered(render_job, jobs):
+            results.append((output, html, seconds))
+            # Stats are cumulative per worker, keep the last ones of each
+            stats[worker_stats['pid']] = worker_stats
+    elapsed = time.perf_counter() - start
+    hits = sum(s['hits'] + s['disk_hits'] for s in stats.values())
+    lookups = hits + sum(s['misses'] for s in stats.values())
+    report = {'jobs': len(jobs), 'seconds': elapsed,
+              'jobs_per_second': len(jobs) / elapsed if elapsed else 0.0,
+              'cache_hits': hits, 'cache_lookups': lookups,
+              'cache_hit_rate': hits / lookups if lookups else 0.0,
+              'workers': len(stats)}
+    return results, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('jobs', help='JSON lines file of {"component", "props", "output"}')
+    parser.add_argument('--module', action='append', default=[], help='module registering components')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: cpu count)')
+    parser.add_argument('--cache-size', type=int, default=1024, help='fragments kept in memory per worker')
+    parser.add_argument('--cache-dir', default=None, help='fragment cache directory shared by the workers')
+    args = parser.parse_args(argv)
+
+    jobs = read_jobs(args.jobs)
+    results, report = prerender(jobs, args.module, args.processes, args.cache_size, args.cache_dir)
+    for output, html, seconds in results:
+        if output is None:
+            sys.stdout.write(html + '\n')
+    sys.stderr.write("%(jobs)d pages in %(seconds).2f s (%(jobs_per_second).1f pages/s, %(workers)d workers), "
+                     "fragment cache: %(cache_hits)d/%(cache_lookups)d hits (%(cache_hit_rate).0f%%)\n"
+                     % dict(report, cache_hit_rate=report['cache_hit_rate'] * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
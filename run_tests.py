@@ -0,0 +1,198 @@
+"""
+Runs the test suites headlessly with CPython (3.9+), test classes in parallel:
+
+    python run_tests.py [Class[.method] ...] [--module NAME ...] [--processes N]
+                        [--no-bench] [--html FILE] [--json FILE] [--baseline FILE]
+
+The `browser` module is provided by components.headless (in memory DOM and
+virtual clock). Test classes are the tester.Tester subclasses of the modules
+(their TESTS tuple if they have one), by default tests.py (also run by
+tests.html) and tests_cpython.py (CPython only suites). Each class runs in a
+worker process of a pool; the global state (RefMap, Register,
+ObjectWithProperties.cnt and the Property values of new instances, the
+document body) is restored to what it was after importing the modules before
+each class, so results don't depend on which classes ran before in the same
+worker. Reports are the TestReport of each class: --html writes them as the
+tests.html page does, --json the benchmarks (bench_ methods) and --baseline
+compares them with a previous --json. Skip reasons are listed once, after
+the classes. Exits with 1 if any test failed.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ('tests', 'tests_cpython')
+
+_modules = {}
+_snapshot = None
+
+
+def _init_worker(modules):
+    global _snapshot
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from components import headless
+    headless.install()
+    import tester
+    tester.shown_skips = None  # Listed once by main
+    for name in modules:
+        _modules[name] = importlib.import_module(name)
+    _snapshot = snapshot_state()
+
+
+def _all_subclasses(cls):
+    stack, found = [cls], []
+    while stack:
+        for sub in stack.pop().__subclasses__():
+            found.append(sub)
+            stack.append(sub)
+    return found
+
+
+def snapshot_state():
+    from components import RefMap, Register, ObjectWithProperties
+    from browser import document
+    return {'refs': dict(RefMap.ref), 'reg': list(Register.reg), 'reg_names': list(Register._reg_names),
+            'cnt': ObjectWithProperties.cnt, 'body': list(document.body.childNodes)}
+
+
+def restore_state(state):
+    """Back to a snapshot_state(): objects created since are forgotten"""
+    from components import RefMap, Register, ObjectWithProperties, scheduler
+    from components.base import _class_props
+    from browser import document
+    scheduler.flush()
+    RefMap.ref.clear()
+    RefMap.ref.update(state['refs'])
+    Register.reg[:] = state['reg']
+    Register._reg_names[:] = state['reg_names']
+    # iids are reused: drop the values and observers of the newer instances
+    cnt = state['cnt']
+    for cls in _all_subclasses(ObjectWithProperties):
+        for prop in _class_props(cls):
+            for table in (prop.storage, prop.observers):
+                for iid in [iid for iid in table if iid >= cnt]:
+                    del table[iid]
+    ObjectWithProperties.cnt = cnt
+    for node in list(document.body.childNodes):
+        if node not in state['body']:
+            document.body.removeChild(node)
+
+
+def test_classes(module):
+    """Tester subclasses of module, in TESTS order if it's defined"""
+    from tester import Tester
+    classes = getattr(module, 'TESTS', None)
+    if classes is None:
+        classes = [c for c in vars(module).values()
+                   if isinstance(c, type) and issubclass(c, Tester) and c is not Tester]
+        classes.sort(key=lambda c: min([f.__code__.co_firstlineno for f in vars(c).values()
+                                        if hasattr(f, '__code__')] or [0]))
+    return list(classes)
+
+
+def run_class(job):
+    """Runs a test class in a worker. Returns (class name, TestReport, seconds)"""
+    module, name, methods, bench = job
+    restore_state(_snapshot)
+    cls = getattr(_modules[module], name)
+    if not methods:
+        prefixes = ('test_', 'bench_') if bench else ('test_',)
+        methods = [m for m in dir(cls) if m.startswith(prefixes)]
+    start = time.perf_counter()
+    report = cls().run(*methods)
+    return name, report, time.perf_counter() - start
+
+
+def run(modules=MODULES, selected=(), processes=None, bench=True):
+    """Runs the test classes (or Class.method) selected, all by default. Returns [(name, TestReport, seconds)]"""
+    _init_worker(modules)
+    methods = {}
+    for item in selected:
+        name, _, method = item.partition('.')
+        methods.setdefault(name, [])
+        if method:
+            methods[name].append(method)
+    jobs = [(module, c.__name__, methods.get(c.__name__, []), bench)
+            for module in modules for c in test_classes(_modules[module])
+            if not selected or c.__name__ in methods]
+    if processes == 1:
+        results = [run_class(job) for job in jobs]
+    else:
+        with Pool(processes, _init_worker, (list(modules),)) as pool:
+            results = pool.map(run_class, jobs, chunksize=1)
+    return results
+
+
+def format_html(results):
+    """The reports as in tests.html"""
+    report_html = ''
+    for name, report, seconds in results:
+        report_html += "<br/> <h2>%s</h2>" % (name,) + report.format_html()
+    return "<html><body><h1>Testing</h1>%s</body></html>" % (report_html,)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('tests', nargs='*', help='test classes or Class.method to run (default: all)')
+    parser.add_argument('--module', action='append', default=[], help='module with test classes (default: %s)'
+                        % ', '.join(MODULES))
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: cpu count)')
+    parser.add_argument('--no-bench', action='store_true', help='skip the bench_ methods')
+    parser.add_argument('--html', default=None, help='write the reports as HTML')
+    parser.add_argument('--json', default=None, help='write the benchmark statistics as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON of a previous --json to compare with')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run(args.module or MODULES, args.tests, args.processes, not args.no_bench)
+    elapsed = time.perf_counter() - start
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, report, seconds in results:
+            report.compare(baseline)
+
+    failed = 0
+    for name, report, seconds in results:
+        status = [r.status for r in report.records.values()]
+        failed += status.count('fail')
+        sys.stdout.write("%s: %d ok, %d failed, %d skipped, %d benchmarks (%.2f s)\n" %
+                         (name, status.count('ok'), status.count('fail'), status.count('skipped'),
+                          len(report.benchmarks), seconds))
+        for method in sorted(report.records):
+            record = report.records[method]
+            if record.status == 'fail':
+                sys.stdout.write("  FAIL %s (line %s): %s\n" % (method, record.lineno, record.args[0]))
+        for method in sorted(report.benchmarks):
+            bench = report.benchmarks[method]
+            ratio = bench.ratio()
+            sys.stdout.write("  bench %s: median %.4f ms, min %.4f ms, stddev %.4f, %.0f ops/s%s\n" %
+                             (method, bench.median, bench.min, bench.stddev, bench.ops,
+                              '' if ratio is None else ', x%.2f baseline' % (ratio,)))
+    skips = {}
+    for name, report, seconds in results:
+        for record in report.records.values():
+            if record.status == 'skipped' and record.args:
+                skips[record.args[0]] = skips.get(record.args[0], 0) + 1
+    for reason in sorted(skips):
+        sys.stdout.write("skipped (%d): %s\n" % (skips[reason], reason))
+    sys.stdout.write("%d classes in %.2f s, %d failed\n" % (len(results), elapsed, failed))
+
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(format_html(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([report.as_dict() for name, report, seconds in results], f, indent=1, sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
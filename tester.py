@@ -7,11 +7,29 @@ setUp() if present.
 
 If the test failed, print the exception, and the line in the script where the
 exception happened.
+
+Methods starting with "bench_" are benchmarks: after a warmup the method is
+called in batches (the number of calls per batch grows until a batch lasts
+timing_batch seconds) and the time per call of each batch is a sample. If the
+method returns a callable, that callable is timed instead (the method is its
+setup). Their statistics are in TestReport.benchmarks.
 """
 
+import json
 import sys
 import time
 
+clock = getattr(time, 'perf_counter', time.time)
+
+# Skip reasons already printed, each is printed once. None: not printed (the
+# reason is also in the "skipped" MethodReport args)
+shown_skips = set()
+
+def _show_skip(kind, exc):
+    if shown_skips is not None and (kind, str(exc)) not in shown_skips:
+        shown_skips.add((kind, str(exc)))
+        print('skip', kind, exc)
+
 class _AssertRaisesBaseContext(object):
 
     def __init__(self, expected, test_case, callable_obj=None,
@@ -80,7 +98,10 @@ class _AssertRaisesContext(_AssertRaisesBaseContext):
 
 
 class Tester:
-    
+    timing_warmup = 3  # Calls before timing
+    timing_batch = 0.02  # Minimum seconds per sample
+    timing_samples = 7
+
     def assertEqual(self, result, expected, msg=None):
         if result != expected:
             if msg is not None:
@@ -128,12 +149,70 @@ class Tester:
     def fail(self, *args):
         raise Exception(str(args))
 
+    def bench(self, func):
+        """Statistics of the time per call of func (see BenchReport)"""
+        for i in range(self.timing_warmup):
+            func()
+        loops = 1
+        while True:
+            t0 = clock()
+            for i in range(loops):
+                func()
+            elapsed = clock() - t0
+            if elapsed >= self.timing_batch:
+                break
+            # Aim for the batch time, at most 10 times more calls per step
+            loops = int(loops * min(10, max(2, 1.2 * self.timing_batch / max(elapsed, 1e-9))))
+        samples = [elapsed / loops]
+        for n in range(self.timing_samples - 1):
+            t0 = clock()
+            for i in range(loops):
+                func()
+            samples.append((clock() - t0) / loops)
+        return BenchReport(samples, loops)
+
+    def _error(self, exc):
+        """Line in the test module where exc happened and its message"""
+        errline = '<nc>'
+        tb = sys.exc_info()[2]
+        try:
+            fname = tb.tb_frame.f_code.co_filename
+        except:
+            fname = '<nc>'
+        while True:
+            if fname == type(self).__module__:
+                errline = tb.tb_lineno
+                break
+            tb = tb.tb_next
+            if tb is None:
+                break
+            fname = tb.tb_frame.f_code.co_filename
+        return 'line {}\n{}'.format(errline, exc)
+
     def run(self, *methods):
         if not methods:
-            methods = [m for m in dir(self) if m.startswith('test_')]
+            methods = [m for m in dir(self) if m.startswith('test_') or m.startswith('bench_')]
         report = TestReport(type(self).__name__)
         for method in methods:
-            if method.startswith('test'):
+            if method.startswith('bench'):
+                f = getattr(self, method)
+                lineno = f.__code__.co_firstlineno
+                if hasattr(self, 'setUp'):
+                    self.setUp()
+                t0 = time.time()
+                try:
+                    func = f()
+                    if not callable(func):
+                        func = f
+                    report.add_bench(method[6:], lineno, self.bench(func))
+                except SkipTest as exc:
+                    _show_skip('benchmark', exc)
+                    report.add(method[6:], lineno,
+                        round((time.time()-t0)*1000), 'skipped', str(exc))
+                except Exception as exc:
+                    report.add(method[6:], lineno,
+                        round((time.time()-t0)*1000), 'fail', self._error(exc))
+            elif method.startswith('test'):
                 f = getattr(self, method)
                 lineno = f.__code__.co_firstlineno
                 if hasattr(self, 'setUp'):
@@ -144,28 +223,12 @@ class Tester:
                     report.add(method[5:], lineno,
                         round((time.time()-t0)*1000), 'ok')
                 except SkipTest as exc:
-                    print('skip test', exc)
+                    _show_skip('test', exc)
                     report.add(method[5:], lineno,
-                        round((time.time()-t0)*1000), 'skipped')
+                        round((time.time()-t0)*1000), 'skipped', str(exc))
                 except Exception as exc:
-                    errmsg = str(exc)
-                    errline = '<nc>'
-                    tb = sys.exc_info()[2]
-                    try:
-                        fname = tb.tb_frame.f_code.co_filename
-                    except:
-                        fname = '<nc>'
-                    while True:
-                        if fname == type(self).__module__:
-                            errline = tb.tb_lineno
-                            break
-                        tb = tb.tb_next
-                        if tb is None:
-                            break
-                        fname = tb.tb_frame.f_code.co_filename
                     report.add(method[5:], lineno, 
-                        round((time.time()-t0)*1000), 'fail', 
-                        'line {}\n{}'.format(errline, errmsg))
+                        round((time.time()-t0)*1000), 'fail', self._error(exc))
         return report
 
 class MethodReport:
@@ -178,16 +241,70 @@ class MethodReport:
         self.status = status
         self.args = args
     
-    
+
+
+class BenchReport:
+    """Statistics of a benchmark method: times per call in milliseconds
+    (min, median, standard deviation), calls per second from the median,
+    calls per sample and, after TestReport.compare, the baseline's median"""
+
+    def __init__(self, samples, loops, lineno=None):
+        times = sorted(t * 1000 for t in samples)
+        n = len(times)
+        self.lineno = lineno
+        self.loops = loops
+        self.samples = n
+        self.min = times[0]
+        self.median = times[n // 2] if n % 2 else (times[n // 2 - 1] + times[n // 2]) / 2
+        mean = sum(times) / n
+        self.stddev = (sum((t - mean) ** 2 for t in times) / (n - 1)) ** 0.5 if n > 1 else 0.0
+        self.ops = 1000 / self.median if self.median else float('inf')
+        self.baseline = None
+
+    def ratio(self):
+        """median / baseline median, None without baseline"""
+        if not self.baseline:
+            return None
+        return self.median / self.baseline
+
+    def as_dict(self):
+        return {'min': self.min, 'median': self.median, 'stddev': self.stddev,
+                'ops': self.ops, 'loops': self.loops, 'samples': self.samples}
+
+
 class TestReport:
     """Used to store the results of tests on a class"""
     
     def __init__(self, class_name):
         self.class_name = class_name
         self.records = {}
+        self.benchmarks = {}
     
     def add(self, method, lineno, time, status, *args):
         self.records[method] = MethodReport(lineno, time, status, args)
+
+    def add_bench(self, method, lineno, bench):
+        bench.lineno = lineno
+        self.benchmarks[method] = bench
+
+    def as_dict(self):
+        """Benchmark statistics, JSON serializable (as_json). Can be used as
+        the baseline of compare"""
+        return {'class': self.class_name,
+                'benchmarks': dict((name, bench.as_dict()) for name, bench in self.benchmarks.items())}
+
+    def as_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def compare(self, baseline):
+        """Sets the baseline medians of the benchmarks from a previous
+        as_dict() (or a list of them, the one of this class is used)"""
+        if isinstance(baseline, list):
+            baseline = ([b for b in baseline if b.get('class') == self.class_name] or [{}])[0]
+        previous = baseline.get('benchmarks', {})
+        for name, bench in self.benchmarks.items():
+            if name in previous:
+                bench.baseline = previous[name]['median']
     
     def format_html(self, name="test_report"):
         """Returns the report as an HTML table"""
@@ -207,6 +324,37 @@ class TestReport:
             else:
                 html += '<td>&nbsp;</td>'
             html += '</tr>\n'
+        html += '</table>'
+        if self.benchmarks:
+            html += self.format_bench_html(name + "_bench")
+        return html
+
+    def format_bench_html(self, name="bench_report"):
+        """Returns the benchmarks as an HTML table, times in ms. Medians 10%
+        slower than the baseline have class "slower", 10% faster "faster"
+        """
+        html = ('<table id="%s" class="report">\n' %name +
+            '<tr class="header"><th>Benchmark</th><th>Line</th><th>Min (ms)</th>'+
+            '<th>Median (ms)</th><th>Std dev</th><th>Ops/s</th><th>Calls</th>'+
+            '<th>Baseline</th></tr>\n')
+        methods = list(self.benchmarks.keys())
+        methods.sort()
+        for method in methods:
+            value = self.benchmarks[method]
+            ratio = value.ratio()
+            if ratio is None:
+                cmp_cls, cmp_text = '', '&nbsp;'
+            else:
+                cmp_cls = ' slower' if ratio > 1.1 else ' faster' if ratio < 0.9 else ''
+                cmp_text = 'x{:.2f}'.format(ratio)
+            html += ('<tr class="bench"><td>{0}</td>'+
+                '<td class="number">{1.lineno}</td>'+
+                '<td class="number">{1.min:.4f}</td>'+
+                '<td class="number">{1.median:.4f}</td>'+
+                '<td class="number">{1.stddev:.4f}</td>'+
+                '<td class="number">{1.ops:.0f}</td>'+
+                '<td class="number">{1.loops}x{1.samples}</td>'+
+                '<td class="number{2}">{3}</td></tr>\n').format(method, value, cmp_cls, cmp_text)
         return html + '</table>'
 
     def __str__(self):
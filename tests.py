@@ -1,7 +1,14 @@
+import json
+import sys
 import tester as unittest
-from components import ObjectWithProperties, Property, HTMLComp, Component, TemplateProcessor, BrowserDOMRender, Register, compile_expr, RefMap, get_props2bind
+from components import initialize_comps_classes, ObjectWithProperties, Property, HTMLComp, Component, TemplateProcessor, BrowserDOMRender, Register, compile_expr, RefMap, get_props2bind, IncrementalMount, scheduler, USER_BLOCKING, IDLE, HTMLFragment, InstructionCache, html_cache, clock, dom_stats
+from components.custom import FilteredList, ListItem, SearchIndex
+from components.base import _class_props
 from browser import document
 
+# Headless DOM (CPython): elements have trigger() and events(). See tests_cpython.py
+HEADLESS = sys.implementation.name != 'brython'
+
 class ObjTest(ObjectWithProperties):
     a = Property(0)
     b = Property(0)
@@ -9,6 +16,13 @@ class ObjTest(ObjectWithProperties):
     def other_func(self):
         return self.a * 10
 
+    def other_func_cb(self, value, instance):
+        if self.received is None:
+            self.received = []
+        self.received.append(value)
+
+    received = None
+
 class TestProperties(unittest.TestCase):
     
     def test_bind_callback(self):
@@ -35,6 +49,29 @@ class TestProperties(unittest.TestCase):
 
         self.assertEqual(result[0], 1)
 
+    def test_duplicate_bind_method(self):
+        """Tests that bound methods are deduped although each access creates a new method object"""
+        obj = ObjTest()
+        listener = ObjTest()
+        obj.bind('a', listener.other_func_cb)
+        obj.bind('a', listener.other_func_cb)
+        obj.a = 3
+        self.assertEqual(listener.received, [3])
+
+    def test_unbind_callback(self):
+        obj = ObjTest()
+        result = []
+        def callback1(value, instance):
+            result.append(1)
+        def callback2(value, instance):
+            result.append(2)
+
+        obj.bind('a', callback1)
+        obj.bind('a', callback2)
+        obj.unbind('a', callback1)
+        obj.a = 1
+        self.assertEqual(result, [2])
+
 
     def test_update_with_expression_self_parent_root(self):
         obj_self = ObjTest()
@@ -56,6 +93,14 @@ class TestProperties(unittest.TestCase):
         obj_self.b = 3
         self.assertEqual(obj_self.a, 16)
 
+    def test_chain_binding_target(self):
+        obj = ObjTest()
+        context = {'self': RefMap.get_ref(obj), 'parent': RefMap.get_ref(obj),'root': RefMap.get_ref(obj),'this': RefMap.add(None)}
+        binding = obj.chain_prop_cback('b', compile_expr('root.a * 2'), context, RefMap.get_ref(obj))
+        self.assertEqual(binding.target, obj._chain_prop)
+        binding(None, obj)
+        self.assertEqual(obj.b, 0)
+
     def test_force_change(self):
         obj = ObjTest()
         result = [0]
@@ -66,6 +111,63 @@ class TestProperties(unittest.TestCase):
 
         self.assertEqual(result[0], 1)
 
+    def test_deferred_priority(self):
+        """Changes in NORMAL/IDLE lanes are stored at once but notified when the scheduler flushes"""
+        obj = ObjTest()
+        result = []
+        obj.bind('a', lambda value, instance: result.append(value))
+
+        def background():
+            obj.a = 1
+            obj.a = 2
+        scheduler.run_with_priority(IDLE, background)
+        self.assertEqual(obj.a, 2)
+        self.assertEqual(result, [])
+        obj.b = 1 # Immediate lane is not deferred
+        scheduler.flush()
+        self.assertEqual(result, [2]) # Coalesced
+
+    def test_user_blocking_priority(self):
+        obj = ObjTest()
+        result = []
+        obj.bind('a', lambda value, instance: result.append(value))
+        scheduler.run_with_priority(USER_BLOCKING, setattr, obj, 'a', 3)
+        self.assertEqual(result, [3])
+
+    def test_bench_report(self):
+        calls = []
+        bench = self.bench(lambda: calls.append(1))
+        self.assertEqual(bench.samples, self.timing_samples)
+        self.assertTrue(len(calls) >= self.timing_warmup + bench.loops * bench.samples)
+        self.assertTrue(bench.loops * bench.median / 1000 >= self.timing_batch / 2)
+        self.assertTrue(bench.min <= bench.median)
+        self.assertTrue(bench.ops > 0)
+        report = unittest.TestReport('TestProperties')
+        report.add_bench('append', 1, bench)
+        previous = json.loads(report.as_json())
+        previous['benchmarks']['append']['median'] = bench.median / 2
+        report.compare([previous])
+        self.assertEqual(bench.ratio(), 2.0)
+        self.assertTrue('class="number slower">x2.00' in report.format_html())
+
+    def test_bench_report_names(self):
+        class Benches(unittest.TestCase):
+            def bench_skipped(self):
+                raise unittest.SkipTest('no timer')
+            def bench_broken(self):
+                raise ValueError('broken')
+        report = Benches().run('bench_skipped', 'bench_broken')
+        self.assertEqual(report.records['skipped'].status, 'skipped')
+        self.assertEqual(report.records['skipped'].args, ('no timer',))
+        self.assertEqual(report.records['broken'].status, 'fail')
+
+    def bench_property_set(self):
+        obj = ObjTest()
+        obj.bind('a', lambda value, instance: None)
+        def set_a():
+            obj.a += 1
+        return set_a
+
 class TestComponent(unittest.TestCase):
     tp = TemplateProcessor()
 
@@ -126,6 +228,24 @@ class TestComponent(unittest.TestCase):
         self.assertEqual(lastc.elem.nodeName, 'LI')
         self.assertEqual(lastc.children[0].elem.nodeName, 'B')
 
+    def test_add_html_cache(self):
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        html_cache.clear()
+        obj.add_html("<li>{root.a}</li>")
+        obj.add_html("<li>{root.a}</li>")
+        self.assertEqual((html_cache.hits, html_cache.misses), (1, 1))
+        fragment = HTMLFragment("<p>Fragment</p>")
+        obj.add_html(fragment)
+        self.assertEqual(html_cache.misses, 2) # Parsed when created
+        self.assertEqual(obj.children[-1].elem.nodeName, 'P')
+        self.assertEqual(obj.children[-2].elem.text, '0')
+        cache = InstructionCache(maxsize=2)
+        for html in ('<a></a>', '<b></b>', '<a></a>', '<i></i>'):
+            cache.get(html)
+        self.assertEqual(list(cache.entries), ['<a></a>', '<i></i>']) # <b> was the least recently used
+
     def test_comp_remove(self):
         obj = MyComponent()
         obj.root = obj
@@ -218,6 +338,308 @@ class TestComponent(unittest.TestCase):
         obj.a = 2
         self.assertEqual(obj2.b, 4)
 
+    def test_incremental_mount(self):
+        template ="""<comp><ul><li>{root.a}</li><li b='{root.b}'>x</li></ul><SubComponent cid='sub'></SubComponent><p>end</p></comp>"""
+        obj = MyComponent()
+        obj.root = obj
+        obj.instructions = self.tp.parse(template)
+        obj.mount()
+        expected = obj.elem.html
+
+        mounted = []
+        obj = MyComponent()
+        obj.root = obj
+        obj.instructions = self.tp.parse(template)
+        obj.on_mount = lambda: mounted.append(obj)
+        mounter = IncrementalMount(obj, budget=0)
+        steps = 0
+        while not mounter.step():
+            steps += 1
+            self.assertFalse(obj.is_mounted)
+        self.assertTrue(steps > 1)
+        self.assertEqual(mounted, [obj])
+        self.assertEqual(obj.get('sub').parent, obj)
+        # Same DOM (but ids) as a synchronous mount
+        self.assertEqual(len(obj.elem.html), len(expected))
+        obj.a = 5
+        self.assertEqual(obj.children[0].children[0].children[0].elem.html, "5")
+
+    def test_hoist_static(self):
+        tp = TemplateProcessor(hoist_static=True)
+        template = """<comp><h1>Title <i>x</i></h1>text<p>{root.a}</p><ul><li>a</li><li cid='c'>c</li></ul></comp>"""
+        instructions = tp.parse(template)
+        self.assertEqual(len(instructions), 3) # STATIC(h1, text), p, ul
+        self.assertEqual(len(instructions[0][1]), 2)
+        obj = MyComponent()
+        obj.root = obj
+        obj.instructions = instructions
+        obj.mount()
+        self.assertEqual(len(obj.children), 2) # p, ul
+        self.assertEqual(len(obj.children[1].children), 1) # li cid='c', li 'a' is static
+        self.assertEqual(obj.get('c').elem.text, 'c')
+        self.assertEqual(obj.elem.html, '<h1 rd="1">Title <i rd="1">x</i></h1>text<p rd="1"><dynode>0</dynode></p>'
+                         '<ul rd="1"><li rd="1">a</li><li cid="c" rd="1">c</li></ul>')
+        obj.remove_all()
+        self.assertEqual(obj.elem.html, '')
+
+    def test_flyweight_nodes(self):
+        obj = MyComponent()
+        obj.root = obj
+        template = """<comp>text<li b='{root.b}'>{root.a}</li><li cid='c'>c</li><b onclick='{root.a}'>x</b></comp>"""
+        obj.instructions = self.tp.parse(template)
+        obj.mount()
+        text, li, li_cid, b = obj.children
+        self.assertEqual([type(c).__name__ for c in obj.children], ['HTMLNode', 'HTMLNode', 'HTMLComp', 'HTMLComp'])
+        self.assertFalse(hasattr(li, '__dict__'))
+        self.assertEqual(li.children[0].elem.html, '0')
+        obj.a, obj.b = 3, 4
+        self.assertEqual(li.children[0].elem.html, '3')
+        self.assertEqual(li.elem.b, '4')
+        self.assertEqual(RefMap.get(li.context['root']), obj) # Built on demand
+        dynode = li.children[0]
+        self.assertEqual(type(dynode).__name__, 'DynNode') # Its own binding
+        self.assertTrue(dynode in MyComponent.a.observers[obj.iid])
+        obj.remove(li)
+        self.assertFalse(dynode in MyComponent.a.observers[obj.iid])
+
+    def test_pool(self):
+        initialize_comps_classes()
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        SubComponent.pool_size = 1
+        try:
+            sub = SubComponent.acquire()
+            sub.a = 5
+            obj.add(sub)
+            elem = sub.elem
+            obj.remove(sub)
+            self.assertEqual(sub.a, 0) # Reset
+            self.assertEqual(len(obj.elem.childNodes), 0)
+            self.assertTrue(SubComponent.acquire() is sub)
+            obj.add(sub)
+            self.assertTrue(sub.elem is elem) # Not mounted again
+            self.assertEqual(sub.parent, obj)
+            other = SubComponent.acquire()
+            obj.add(other)
+            obj.remove(sub)
+            obj.remove(other) # Pool is full
+            self.assertTrue(other.elem is None)
+            self.assertTrue(SubComponent.acquire() is sub)
+        finally:
+            SubComponent.pool_size = 0
+
+    def test_pool_template_bindings(self):
+        initialize_comps_classes()
+        counter = CounterComponent()
+        counter.root = counter
+        counter.mount()
+        sub = counter.query(tag='SubComponent')[0]
+        SubComponent.pool_size = 1
+        try:
+            counter.remove(sub)
+            counter.n = 42
+            self.assertEqual(sub.a, 0) # Released from the template of counter
+            self.assertTrue(SubComponent.acquire() is sub)
+            obj = MyComponent()
+            obj.root = obj
+            obj.mount()
+            obj.add(sub)
+            counter.n = 7
+            self.assertEqual(sub.a, 0)
+            self.assertEqual(counter.n, 7)
+        finally:
+            SubComponent.pool_size = 0
+
+    def test_query(self):
+        obj = MyComponent()
+        obj.root = obj
+        template = """<comp><ul cid='list'><li>a</li><li cid='b'>b</li></ul><p>{root.a}</p><SubComponent cid='sub'></SubComponent></comp>"""
+        obj.instructions = self.tp.parse(template)
+        obj.mount()
+        lis = obj.query(tag='li')
+        self.assertEqual([li.elem.text for li in lis], ['a', 'b'])
+        self.assertTrue(obj.query(tag='li') is lis) # Cached
+        self.assertEqual(obj.query(cid='b'), (obj.get('b'),))
+        self.assertEqual(obj.query(cid='sub', tag='SubComponent'), (obj.get('sub'),))
+        ulist = obj.get('list')
+        ulist.remove(obj.get('b'))
+        self.assertEqual(len(obj.query(tag='li')), 1)
+        self.assertFalse('b' in obj.ids) # Found with the reverse index
+        self.assertEqual(obj.query(cid='b'), ())
+
+    def test_teardown(self):
+        initialize_comps_classes()
+        obj = MyComponent()
+        obj.root = obj
+        template = """<comp><div cid='box'><CounterComponent n='{root.a}' cid='c'></CounterComponent><p>{root.b}</p></div></comp>"""
+        obj.instructions = self.tp.parse(template)
+        obj.mount()
+        counter = obj.get('c')
+        button = counter.children[1]
+        unmounted = []
+        counter.on_unmount = lambda: unmounted.append(counter)
+        self.assertTrue(len(MyComponent.a.observers[obj.iid]) > 0)
+        obj.remove_all()
+        self.assertEqual(len(obj.elem.childNodes), 0)
+        self.assertEqual(unmounted, [counter])
+        self.assertEqual(len(MyComponent.a.observers[obj.iid]), 0)
+        self.assertEqual(len(MyComponent.b.observers[obj.iid]), 0)
+        if HEADLESS:
+            self.assertEqual(button.elem.events('click'), [])
+        self.assertFalse('c' in obj.ids)
+        self.assertFalse(counter.iid in CounterComponent.n.storage)
+        obj.a = 3 # Nothing left to update
+
+    def test_teardown_storage(self):
+        initialize_comps_classes()
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        props = _class_props(ListItem)
+        sizes = lambda: [(len(p.storage), len(p.observers)) for p in props]
+        start = sizes()
+        refs = len(RefMap.ref)
+        for i in range(2):
+            for n in range(100):
+                item = ListItem()
+                item.text = str(n)
+                obj.add(item)
+            obj.remove(item)
+            obj.remove_all()
+            self.assertEqual(sizes(), start)
+            self.assertEqual(len(RefMap.ref), refs)
+
+    def test_search_index(self):
+        items = ['Apples', 'Pears', 'Oranges', 'Papayas', 'Grapes']
+        for ngram in (0, 2):
+            index = SearchIndex(items, ngram)
+            self.assertEqual(index.search('AP'), ['Apples', 'Papayas', 'Grapes'])
+            self.assertEqual(index.search('ape'), ['Grapes']) # Narrowed
+            self.assertEqual(index.search('a'), ['Apples', 'Pears', 'Oranges', 'Papayas', 'Grapes'])
+            self.assertEqual(index.search('xyz'), [])
+            self.assertEqual(index.search(''), items)
+
+    def test_filtered_list(self):
+        initialize_comps_classes()
+        flist = FilteredList()
+        flist.root = flist
+        flist.mount()
+        flist.initial_items = ['Apples', 'Pears', 'Oranges']
+        flist.filtervalue = 'pe'
+        self.assertEqual([c.value for c in flist.children], ['Pears'])
+        flist.filtervalue = ''
+        self.assertEqual([c.value for c in flist.children], ['Apples', 'Pears', 'Oranges'])
+        self.assertEqual([n.text for n in flist.elem.childNodes], ['Apples', 'Pears', 'Oranges'])
+
+    def test_dom_stats(self):
+        initialize_comps_classes()
+        flist = FilteredList()
+        flist.root = flist
+        flist.mount()
+        flist.initial_items = ['Apples', 'Pears', 'Oranges', 'Papayas']
+        with dom_stats as stats:
+            flist.filtervalue = 'p'
+        self.assertFalse(dom_stats.enabled)
+        self.assertEqual(stats.total('removeChild', prop='FilteredList.filtervalue'), 1) # Oranges
+        with dom_stats as stats:
+            flist.filtervalue = 'pa'
+        self.assertEqual(stats.by('operation'), {'removeChild': 2})
+        with dom_stats as stats:
+            flist.filtervalue = ''
+        # Apples, Pears, Oranges: created, inserted in place, rd and html set
+        self.assertEqual(stats.total('createElement', cls='HTMLComp'), 3)
+        self.assertEqual(stats.total('insertBefore'), 3)
+        self.assertTrue(stats.total() <= 12)
+
+    def test_hot_reload(self):
+        code = """
+from components import Register, Component, Property
+class Counter(Component):
+    template = "<Counter>{root.n}</Counter>"
+    n = Property(0)
+class Label(Component):
+    template = "<Label>{root.text}</Label>"
+    text = Property('')
+Register.add(Counter)
+Register.add(Label)
+"""
+        from editor import HotReloader # Registers the editor components, only for these tests
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        reloader = HotReloader(Register.reg)
+        try:
+            reloader.reload(code, obj)
+            obj.add_html("<div><Counter cid='c' n='{root.a}'></Counter><Label text='hi'></Label></div>")
+            counter, label = obj.children[0].children
+            counter.n = 5
+            label.text = 'changed'
+            changed = reloader.reload(code.replace("{root.n}<", "n={root.n}<"), obj)
+            self.assertEqual(changed, ['Counter'])
+            new, same = obj.children[0].children
+            self.assertTrue(same is label) # Untouched
+            self.assertFalse(new is counter)
+            self.assertTrue(obj.get('c') is new)
+            self.assertEqual(new.n, 5) # State kept
+            self.assertEqual(obj.children[0].elem.childNodes[0], new.elem) # In place
+            self.assertEqual(new.elem.text, 'n=5')
+            obj.a = 7 # Outer template binding
+            self.assertEqual(new.n, 7)
+            self.assertEqual(reloader.reload(code.replace("{root.n}<", "n={root.n}<"), obj), [])
+        finally:
+            reloader.reload('', obj)
+
+    def test_hot_reload_nested(self):
+        code = """
+from components import Register, Component
+class Inner(Component):
+    template = "<Inner><b>Count:</b></Inner>"
+class Outer(Component):
+    template = "<Outer><Inner></Inner></Outer>"
+Register.add(Inner)
+Register.add(Outer)
+"""
+        from editor import HotReloader # Registers the editor components, only for these tests
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        reloader = HotReloader(Register.reg)
+        try:
+            reloader.reload(code, obj)
+            obj.add_html("<Outer></Outer>")
+            self.assertEqual(reloader.reload(code.replace("Count:", "Total:"), obj), ['Inner'])
+            obj.remove_all()
+            obj.add_html("<Outer></Outer>")
+            self.assertTrue('Total:</b>' in obj.elem.html)
+            self.assertFalse('Count:' in obj.elem.html)
+        finally:
+            reloader.reload('', obj)
+
+    def bench_counter_click(self):
+        initialize_comps_classes()
+        obj = CounterComponent()
+        obj.root = obj
+        obj.mount()
+        return obj.inc
+
+    def test_clock(self):
+        obj = MyComponent()
+        obj.root = obj
+        obj.mount()
+        subs = [SubComponent() for i in range(3)]
+        for sub in subs:
+            obj.add(sub)
+            sub.every(1000, lambda sub=sub: setattr(sub, 'a', sub.a + 1))
+        self.assertEqual(len(clock.periods[1000][1]), 3) # One timer
+        scheduler.run_with_priority(IDLE, clock._tick, 1000)
+        scheduler.flush()
+        self.assertEqual([sub.a for sub in subs], [1, 1, 1])
+        obj.remove(subs[0])
+        self.assertEqual(len(clock.periods[1000][1]), 2)
+        obj.remove_all()
+        self.assertFalse(1000 in clock.periods) # Timer cleared
+
 class MyComponent(Component):
     template="<MyComponent></MyComponent>"
     tag = 'MyComponent'
@@ -231,18 +653,30 @@ class SubComponent(Component):
     b = Property(2)
     
 
+class CounterComponent(Component):
+    template="<CounterComponent><h1>{root.n}</h1><button onclick='{root.inc()}'>+</button><SubComponent a='{root.n}'></SubComponent></CounterComponent>"
+    n = Property(0)
+
+    def inc(self):
+        self.n += 1
+
 Register.add(SubComponent)
 Register.add(MyComponent)
+Register.add(CounterComponent)
    
 
 BrowserDOMRender.direct = True
 TESTS = (TestProperties, TestComponent)
-report_html = ''
-document['status'].html = "Testing..."
-for t in TESTS:
-    document['status'].html = "Processing %s"%(t.__name__)
-    tester = t()
-    report = tester.run()
-    report_html += "<br/> <h2>%s</h2>"%(t.__name__) + report.format_html()
-document['status'].html = "Testing done"
-document['report'].html = report_html
+
+
+def main(tests=TESTS):
+    """Runs tests showing the reports in the page (tests.html). See run_tests.py for CPython"""
+    report_html = ''
+    document['status'].html = "Testing..."
+    for t in tests:
+        document['status'].html = "Processing %s"%(t.__name__)
+        tester = t()
+        report = tester.run()
+        report_html += "<br/> <h2>%s</h2>"%(t.__name__) + report.format_html()
+    document['status'].html = "Testing done"
+    document['report'].html = report_html
@@ -0,0 +1,242 @@
+"""
+Suites that need CPython: weak references, the recorder and the profiler
+(headless DOM events), server side rendering, prerender.py and build.py.
+Run them with run_tests.py; tests.html runs the tests.py suites only.
+"""
+import contextlib
+import gc
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import weakref
+import build
+import tester as unittest
+from components import initialize_comps_classes, HTMLComp, RefMap, compile_expr, dom_stats, scheduler, IDLE
+from components.server import render_to_string, stream_render, FragmentCache, renumber_ids
+from components.custom import FilteredList
+from components.base import _class_props
+from components.recorder import Recorder, replay
+from components.profiler import Profiler
+from browser import document
+from tests import ObjTest, CounterComponent
+
+
+class TestBindings(unittest.TestCase):
+
+    def test_weak_chain_binding(self):
+        obj_root = ObjTest()
+        obj_self = ObjTest()
+        context = {'self': RefMap.get_ref(obj_self), 'parent': RefMap.get_ref(obj_root),'root': RefMap.get_ref(obj_root),'this': RefMap.add(None)}
+        obj_self.update_with_expression('a', compile_expr('root.b + 1'), context, props2bind=[['root', 'b']])
+        obj_root.b = 1
+        self.assertEqual(obj_self.a, 2)
+        self.assertEqual(len(ObjTest.b.observers[obj_root.iid]), 1)
+        # Dropped without teardown: only the binding could keep it alive
+        alive = weakref.ref(obj_self)
+        RefMap.remove(obj_self)
+        del obj_self
+        gc.collect()
+        self.assertTrue(alive() is None)
+        obj_root.b = 2
+        self.assertEqual(len(ObjTest.b.observers[obj_root.iid]), 0)
+
+
+class TestRecorder(unittest.TestCase):
+
+    def test_recorder(self):
+        initialize_comps_classes()
+        comp = CounterComponent()
+        comp.root = comp
+        comp.mount()
+        button = comp.children[1]
+        with Recorder(comp) as recorder:
+            button.elem.trigger('click')
+            button.elem.trigger('click')
+            comp.n = 10
+            button.elem.trigger('click')
+            scheduler.run_with_priority(IDLE, setattr, comp, 'n', 5)
+            scheduler.flush()
+            comp.n = 10
+        # Consequences (n += 1, SubComponent.a, also when deferred) aren't recorded
+        self.assertEqual([e[1:5] for e in recorder.entries],
+                         [['event', 'HTMLComp', [1], 'click']] * 2 + [['set', 'CounterComponent', [], 'n']] +
+                         [['event', 'HTMLComp', [1], 'click']] + [['set', 'CounterComponent', [], 'n']] * 2)
+        trace = json.loads(json.dumps(recorder.trace()))
+        root = CounterComponent()
+        root.root = root
+        root.mount()
+        stats = replay(trace, root=root)
+        self.assertEqual(stats['missing'], 0)
+        self.assertEqual(root.n, 10)
+        self.assertEqual(root.children[2].a, 10)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_profiler(self):
+        initialize_comps_classes()
+        sessions = []
+        profiler = Profiler(on_session=sessions.append)
+        with profiler:
+            obj = CounterComponent()
+            obj.root = obj
+            obj.mount()
+        report = profiler.report()
+        self.assertEqual(report['created'], 3)
+        self.assertEqual([m[0] for m in report['mounts']], ['CounterComponent', 'SubComponent'])
+        self.assertTrue(report['dom_ops'] > 0)
+        profiler.start()
+        try:
+            obj.children[1].elem.trigger('click')
+        finally:
+            profiler.stop()
+        self.assertFalse(dom_stats.enabled)
+        self.assertEqual(len(sessions), 1)
+        report = sessions[0]
+        self.assertEqual(report['label'], 'click button')
+        self.assertEqual(report['notifications'], 2) # h1 text and SubComponent.a
+        self.assertEqual(report['dom_ops'], 1)
+        self.assertEqual(sorted(b[0] for b in report['bindings']),
+                         ['CounterComponent <dynode> html = {root.n}', 'SubComponent.a = {root.n}'])
+        from editor import PerfPanel # Registers the editor components, only for this test
+        initialize_comps_classes()
+        panel = PerfPanel()
+        panel.root = panel
+        panel.mount()
+        toggled = []
+        panel.bind('enabled', lambda value, instance: toggled.append(value))
+        panel.get('toggle').elem.checked = True
+        panel.get('toggle').elem.trigger('click')
+        self.assertEqual(toggled, [True])
+        panel.show(report)
+        self.assertTrue('SubComponent.a = {root.n}' in panel.get('report').elem.html)
+        self.assertTrue('.hot' in panel.elem.html) # Scoped style kept
+
+
+class TestServer(unittest.TestCase):
+
+    def test_render_to_string(self):
+        html = render_to_string(CounterComponent, n=2)
+        self.assertIn('<h1 rd="1"><dynode>2</dynode></h1>', html)
+        self.assertIn('n="{2}"', html)
+        self.assertIn('id="CounterComponent_', html)
+
+    def test_render_releases(self):
+        props = _class_props(CounterComponent) + _class_props(FilteredList) + _class_props(HTMLComp)
+        sizes = lambda: [len(RefMap.ref)] + [len(p.storage) + len(p.observers) for p in props]
+        render_to_string(CounterComponent, n=2)
+        ''.join(stream_render(FilteredList, initial_items=['a', 'b'])) # Not streamable
+        start = sizes()
+        for i in range(3):
+            render_to_string(CounterComponent, n=i)
+            ''.join(stream_render(FilteredList, initial_items=['a', 'b']))
+        self.assertEqual(sizes(), start)
+
+    def test_stream_render(self):
+        chunks = list(stream_render(CounterComponent, chunk_size=16, n=2))
+        self.assertTrue(len(chunks) > 1)
+        expected = render_to_string(CounterComponent, n=2)
+        normalize = lambda html: re.sub('_[0-9]+', '_N', html)
+        self.assertEqual(normalize(''.join(chunks)), normalize(expected))
+
+    def test_stream_render_markup(self):
+        normalize = lambda html: re.sub('_[0-9]+', '_N', html)
+        for n in ('<hi>', 'a < b & c', '<b>x</b> > y', 7):
+            streamed = ''.join(stream_render(CounterComponent, n=n))
+            self.assertEqual(normalize(streamed), normalize(render_to_string(CounterComponent, n=n)))
+        self.assertIn('<dynode><hi></hi></dynode>', ''.join(stream_render(CounterComponent, n='<hi>')))
+
+    def test_hydrate(self):
+        container = document.createElement('div')
+        container.html = render_to_string(CounterComponent, n=2)
+        elem = container.childNodes[0]
+        h1 = elem.childNodes[0]
+        button = elem.childNodes[1]
+
+        comp = CounterComponent(elem)
+        comp.root = comp
+        comp.hydrate()
+        self.assertEqual(comp.n, 2)
+        self.assertEqual(len(elem.childNodes), 3) # No new nodes
+        self.assertEqual(comp.children[0].elem, h1) # Adopted
+        self.assertEqual(comp.children[1].elem, button)
+        comp.n = 5
+        self.assertEqual(h1.html, '<dynode>5</dynode>')
+        # Static text that doesn't match the template isn't adopted
+        container.html = render_to_string(CounterComponent, n=2).replace('>+<', '>-<')
+        comp = CounterComponent(container.childNodes[0])
+        comp.root = comp
+        comp.hydrate()
+        self.assertEqual(comp.elem.childNodes[1].text, '+')
+
+    def test_fragment_cache(self):
+        cache = FragmentCache(maxsize=8)
+        first = ''.join(stream_render(CounterComponent, cache=cache, n=2))
+        second = ''.join(stream_render(CounterComponent, cache=cache, n=2))
+        self.assertEqual(cache.hits, 1)
+        self.assertNotEqual(first, second) # New component ids
+        normalize = lambda html: re.sub('_[0-9]+', '_N', html)
+        self.assertEqual(normalize(first), normalize(second))
+        self.assertEqual(cache.misses, 2) # Root and SubComponent
+        ''.join(stream_render(CounterComponent, cache=cache, n=3))
+        self.assertEqual(cache.misses, 4)
+
+    def test_renumber_ids(self):
+        html = ('<s id="S_3" rd="1" title="a>b id=S_3"><style rd="1">#S_3 p{color:red}</style>'
+                '<p rd="1">S_3 #S_3 id="S_3"</p><i id="I_4"></i></s>')
+        renumbered = renumber_ids(html)
+        s_id = re.match('<s id="(S_[0-9]+)"', renumbered).group(1)
+        i_id = re.search('<i id="(I_[0-9]+)"', renumbered).group(1)
+        self.assertNotEqual(s_id, 'S_3')
+        expected = html.replace(' id="S_3" rd', ' id="%s" rd' % (s_id,)).replace('#S_3 p', '#%s p' % (s_id,))
+        self.assertEqual(renumbered, expected.replace('I_4', i_id)) # Texts and other attributes kept
+
+
+class TestPrerender(unittest.TestCase):
+
+    def test_prerender_cli(self):
+        jobs = [{"component": "FilteredList", "props": {"initial_items": ["a", "b"]}, "output": "out/list.html"},
+                {"component": "FilteredList", "props": {"initial_items": ["a", "b"]}, "output": "out/list2.html"},
+                {"component": "components.custom:ListItem", "props": {"text": "hi"}}]
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'jobs.jsonl'), 'w') as f:
+                f.write('\n'.join(json.dumps(job) for job in jobs))
+            command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prerender.py'), 'jobs.jsonl',
+                       '--module', 'components.custom', '--processes', '2', '--cache-dir', 'cache']
+            for run in range(2):
+                result = subprocess.run(command, cwd=tmp, capture_output=True, text=True)
+                self.assertEqual(result.returncode, 0)
+                self.assertIn('<dynode>hi</dynode>', result.stdout) # No output: printed
+                report = re.search(r'3 pages in [0-9.]+ s \([0-9.]+ pages/s, [12] workers\)', result.stderr)
+                self.assertTrue(report is not None)
+            # Second run: every page from the shared cache
+            self.assertIn('fragment cache: 3/3 hits', result.stderr)
+            for name in ('list.html', 'list2.html'):
+                with open(os.path.join(tmp, 'out', name)) as f:
+                    self.assertIn('id="FilteredList_', f.read())
+
+
+class TestBuild(unittest.TestCase):
+
+    def test_bundle(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'components.vfs.js')
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                build.bundle([], output)
+            with open(output) as f:
+                source = f.read()
+        vfs = json.loads(source[source.index('var modules = ') + 14:source.index(';\n    for')])
+        self.assertTrue(out.getvalue().startswith(output + ': 4 modules'))
+        self.assertEqual(vfs['components'][0], '.py')
+        self.assertEqual(vfs['components'][2:], [[], 1]) # [ext, source, imports, is_package]
+        self.assertEqual(len(vfs['components.base']), 2)
+        for name in build.CPYTHON_ONLY:
+            self.assertNotIn(name, vfs)
+        self.assertIn('TEMPLATES = {', vfs['components._precompiled'][1])
+
+
+TESTS = (TestBindings, TestRecorder, TestProfiler, TestServer, TestPrerender, TestBuild)